@@ -0,0 +1,214 @@
+from __future__ import annotations
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Hashable, Optional, Tuple
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+from . import metrics
+
+logger = logging.getLogger("moodflix")
+
+
+class TTLCache:
+    """
+    Cache en memoria con vencimiento por entrada (TTL) y tope de memoria.
+
+    Cuando se pasa del tope de bytes se desalojan las entradas usadas hace
+    más tiempo (LRU). Los valores se devuelven tal cual se guardaron, así
+    que quien los lee no los tiene que modificar.
+    """
+
+    def __init__(self, name: str, max_bytes: int) -> None:
+        self.name = name
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (valor, vence_en, tamaño)
+        self._data: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] <= now:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                metrics.incr(f"{self.name}.miss")
+                return None
+            self._data.move_to_end(key)
+        metrics.incr(f"{self.name}.hit")
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: float, size: int = 1) -> None:
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, time.monotonic() + ttl, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                metrics.incr(f"{self.name}.evicted")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+
+class SQLiteCache:
+    """
+    Cache persistente en un archivo SQLite: clave -> texto (JSON).
+
+    Cada entrada guarda cuándo se escribió y hasta cuándo se puede usar,
+    así sobrevive a reinicios y quien lee decide si está fresca o vieja.
+    La conexión se abre recién en el primer uso.
+
+    Con max_bytes > 0 el archivo tiene tope: cuando los valores guardados
+    se pasan, se borran primero los vencidos y después los más viejos
+    (por stored_at) hasta bajar al 90% del tope.
+
+    get/set son bloqueantes; desde el event loop se usan aget (en un
+    thread) y set_behind (encola la escritura en un thread propio, en
+    orden, sin esperarla).
+    """
+
+    def __init__(self, name: str, path: Path | str, max_bytes: int = 0) -> None:
+        self.name = name
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._bytes = 0
+        self._writer: Optional[ThreadPoolExecutor] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_stored_at ON cache(stored_at)")
+            # Limpieza de lo que ya no se puede usar ni como dato viejo
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+            self._conn = conn
+            self._bytes = self._total_bytes()
+            if self.max_bytes and self._bytes > self.max_bytes:
+                self._prune()
+        return self._conn
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM cache").fetchone()[0]
+
+    def _prune(self) -> None:
+        """
+        Baja el archivo al 90% del tope. Se llama con el lock tomado.
+        """
+        conn = self._conn
+        conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        self._bytes = self._total_bytes()
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        while self._bytes > target:
+            rows = conn.execute("SELECT key, LENGTH(value) FROM cache ORDER BY stored_at LIMIT 500").fetchall()
+            if not rows:
+                break
+            dropped = []
+            for key, size in rows:
+                dropped.append((key,))
+                self._bytes -= size
+                if self._bytes <= target:
+                    break
+            conn.executemany("DELETE FROM cache WHERE key = ?", dropped)
+            removed += len(dropped)
+        if removed:
+            metrics.incr(f"{self.name}.evicted", removed)
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """
+        Devuelve (texto, stored_at) si la entrada existe y no venció.
+        """
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT value, stored_at FROM cache WHERE key = ? AND expires_at > ?",
+                    (key, time.time()),
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("⚠️ No se pudo leer el cache %s: %s", self.name, e)
+            row = None
+
+        metrics.incr(f"{self.name}.hit" if row else f"{self.name}.miss")
+        return (row[0], row[1]) if row else None
+
+    async def aget(self, key: str) -> Optional[Tuple[str, float]]:
+        """
+        Como get, pero la consulta corre en un thread y no frena el loop.
+        """
+        return await asyncio.to_thread(self.get, key)
+
+    def set(self, key: str, value: str, ttl: float, stored_at: Optional[float] = None) -> None:
+        stored_at = time.time() if stored_at is None else stored_at
+        try:
+            with self._lock:
+                self._connect().execute(
+                    "INSERT OR REPLACE INTO cache (key, value, stored_at, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, value, stored_at, stored_at + ttl),
+                )
+                # Cuenta aproximada (un reemplazo suma de más); _prune recalcula
+                self._bytes += len(value)
+                if self.max_bytes and self._bytes > self.max_bytes:
+                    self._prune()
+        except sqlite3.Error as e:
+            logger.warning("⚠️ No se pudo escribir el cache %s: %s", self.name, e)
+
+    def set_behind(self, key: str, value: str, ttl: float, stored_at: Optional[float] = None) -> None:
+        """
+        Encola el set en un thread propio y vuelve enseguida (write-behind).
+        """
+        with self._lock:
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{self.name}-writer")
+            writer = self._writer
+        try:
+            writer.submit(self.set, key, value, ttl, stored_at)
+        except RuntimeError:
+            # Cerrado mientras se apagaba el proceso: la entrada se pierde
+            pass
+
+    def close(self) -> None:
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            # Que las escrituras encoladas lleguen al disco antes de cerrar
+            writer.shutdown(wait=True)
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,17 +1,34 @@
 from __future__ import annotations
-from typing import Dict, Any, Tuple
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Set
+import asyncio
 import logging
+import threading
 
+from . import metrics
+from .config import settings
 from .utils import (
-    extract_slots_from_text,
+    extract_slots_from_text_async,
     merge_slots,
-    discover_tmdb,
-    build_recommendations_from_tmdb,
-    save_conversation_history,
+    discover_tmdb_async,
+    discover_query_key,
+    rank_candidates,
+    hydrate_ranked_async,
+    RecCallback,
+    save_conversation_history_async,
+    run_sync,
 )
 
 logger = logging.getLogger("moodflix")
 
+# Recibe el texto parcial de la respuesta mientras se arma (ej: para ir
+# editando un mensaje de Telegram a medida que llegan las recomendaciones)
+Progress = Callable[[str], Awaitable[None]]
+
+
+def _log_task_error(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("⚠️ Falló una tarea en segundo plano: %s", task.exception())
+
 
 class ChatManager:
     """
@@ -22,28 +39,47 @@ class ChatManager:
 
     def __init__(self) -> None:
         self.conversation_state: Dict[str, Dict[str, Any]] = {}
+        self._user_locks: Dict[str, asyncio.Lock] = {}
+        # La API sync y la async pueden convivir en un proceso (loop del
+        # llamador y "moodflix-sync-loop"): el estado se toca desde los dos
+        self._state_lock = threading.Lock()
 
     # -------------------------
     # Helpers de estado
     # -------------------------
 
     def _get_state(self, user_id: str) -> Dict[str, Any]:
-        if user_id not in self.conversation_state:
+        with self._state_lock:
+            if user_id not in self.conversation_state:
+                self.conversation_state[user_id] = {
+                    "slots": {},
+                    "last_intent": None,
+                    "last_question": None,
+                    "cursor": None,
+                    "speculative": None,
+                }
+            return self.conversation_state[user_id]
+
+    def _user_lock(self, user_id: str) -> asyncio.Lock:
+        with self._state_lock:
+            lock = self._user_locks.get(user_id)
+            if lock is None:
+                lock = self._user_locks[user_id] = asyncio.Lock()
+            return lock
+
+    def _reset_state(self, user_id: str) -> None:
+        with self._state_lock:
+            old = self.conversation_state.get(user_id)
+            if old:
+                self._drop_cursor(old)
+                self._drop_speculative(old)
             self.conversation_state[user_id] = {
                 "slots": {},
                 "last_intent": None,
                 "last_question": None,
-                "page": 1,
+                "cursor": None,
+                "speculative": None,
             }
-        return self.conversation_state[user_id]
-
-    def _reset_state(self, user_id: str) -> None:
-        self.conversation_state[user_id] = {
-            "slots": {},
-            "last_intent": None,
-            "last_question": None,
-            "page": 1,
-        }
 
     # -------------------------
     # Mensajes de bienvenida
@@ -62,7 +98,29 @@ class ChatManager:
     # Punto de entrada
     # -------------------------
 
-    def handle_message(self, user_id: str, text: str) -> str:
+    def handle_message(self, user_id: str, text: str, progress: Optional[Progress] = None) -> str:
+        """
+        Versión sincrónica: wrapper fino sobre handle_message_async.
+        """
+        return run_sync(self.handle_message_async(user_id, text, progress))
+
+    async def handle_message_async(
+        self,
+        user_id: str,
+        text: str,
+        progress: Optional[Progress] = None,
+    ) -> str:
+        """
+        Devuelve la respuesta completa. Si se pasa `progress`, mientras se
+        buscan recomendaciones se lo llama con la respuesta parcial
+        (primero un "buscando…" y después cada tarjeta apenas está lista).
+        """
+        # Un mensaje por usuario a la vez: el estado se modifica entre awaits,
+        # así que dos mensajes del mismo user_id no se pueden pisar.
+        async with self._user_lock(user_id):
+            return await self._handle_message(user_id, text, progress)
+
+    async def _handle_message(self, user_id: str, text: str, progress: Optional[Progress] = None) -> str:
         raw_text = text.strip()
         lower = raw_text.lower()
 
@@ -74,26 +132,29 @@ class ChatManager:
             return self._welcome_message()
 
         if lower in ("otra", "otra peli", "otra película", "otra serie"):
-            state = self._get_state(user_id)
-            state["page"] += 1
-            return self._try_recommend(user_id, reason="otra_opcion")
+            return await self._try_recommend(user_id, reason="otra_opcion", progress=progress)
 
         if lower in ("gracias", "gracia", "listo", "salir", "bye", "ok", "bueno", "chau", "chao", "me voy", "/end", "/stop"):
             self._reset_state(user_id)
             return "¡Gracias por usar el bot! Cuando quieras volvemos a buscar algo para ver 🍿"
 
-        return self._process_user_message(user_id, raw_text)
+        return await self._process_user_message(user_id, raw_text, progress)
 
     # -------------------------
     # Lógica principal
     # -------------------------
 
-    def _process_user_message(self, user_id: str, text: str) -> str:
+    async def _process_user_message(
+        self,
+        user_id: str,
+        text: str,
+        progress: Optional[Progress] = None,
+    ) -> str:
         state = self._get_state(user_id)
         slots_actuales = state["slots"]
         ultima_pregunta = state["last_question"]
 
-        parsed = extract_slots_from_text(
+        parsed = await extract_slots_from_text_async(
             user_text=text,
             last_question=ultima_pregunta,
             prev_slots=slots_actuales,
@@ -112,7 +173,8 @@ class ChatManager:
         merged_slots = merge_slots(slots_actuales, new_slots)
         state["slots"] = merged_slots
         state["last_intent"] = intent
-        state["page"] = 1
+        # Cambiaron los gustos: los candidatos guardados ya no sirven
+        self._drop_cursor(state)
 
         if intent == "other":
             msg = (
@@ -121,7 +183,8 @@ class ChatManager:
                 "• \"Recomendame una película de comedia\"\n"
                 "• \"Quiero una serie cortita para ver en familia\"\n"
             )
-            save_conversation_history(user_id, text, msg, parsed)
+            # Solo encola el turno (o espera al disco en un thread, en "sync"/"block")
+            await save_conversation_history_async(user_id, text, msg, parsed, ultima_pregunta)
             return msg
 
         # Limpia last_question para que busque la siguiente
@@ -131,11 +194,13 @@ class ChatManager:
         if question:
             state["last_question"] = question["key"]
             reply = question["text"]
-            save_conversation_history(user_id, text, reply, parsed)
+            # Mientras el usuario contesta, adelantamos la búsqueda
+            self._maybe_speculate(state, merged_slots, question["key"])
+            await save_conversation_history_async(user_id, text, reply, parsed, ultima_pregunta)
             return reply
 
-        reply = self._try_recommend(user_id)
-        save_conversation_history(user_id, text, reply, parsed)
+        reply = await self._try_recommend(user_id, progress=progress)
+        await save_conversation_history_async(user_id, text, reply, parsed, ultima_pregunta)
         return reply
 
     # -------------------------
@@ -205,202 +270,313 @@ class ChatManager:
             return {"key": "novedad",
                     "text": "¿Preferís algo **nuevo** o también te va algún **clásico**?"}
 
-        if contexto is None or contexto == "":
-            return {"key": "contexto",
-                    "text": "¿Lo vas a ver solo, con pareja, con amigos/as o en familia?"}
-
         if fama is None or fama == "":
             return {"key": "fama",
                     "text": "¿Algo muy conocido o una joyita poco vista?"}
 
+        # Contexto va al final: solo reordena los resultados, así que la
+        # búsqueda especulativa ya se puede lanzar con la consulta definitiva
+        if contexto is None or contexto == "":
+            return {"key": "contexto",
+                    "text": "¿Lo vas a ver solo, con pareja, con amigos/as o en familia?"}
+
         return None
 
+    # -------------------------
+    # Cursor de candidatos por usuario
+    # -------------------------
+    #
+    # Guarda lo que quedó rankeado de la búsqueda actual, así "otra" sale
+    # del buffer sin volver a llamar a discover. Cuando el buffer baja de
+    # RESULTS_LOW_WATER se trae la página siguiente en segundo plano.
+
+    def _new_cursor(self, tipo: str) -> Dict[str, Any]:
+        return {
+            "tipo": tipo,
+            "candidates": [],     # rankeados y pre-filtrados, sin mostrar
+            "seen": set(),        # ids ya usados (mostrados o descartados)
+            "shown": 0,           # recomendaciones que llegaron al usuario
+            "next_page": 1,
+            "total_pages": None,
+            "prefetch": None,     # asyncio.Task con la próxima página
+        }
+
+    def _drop_cursor(self, state: Dict[str, Any]) -> None:
+        cursor = state.get("cursor")
+        if cursor and cursor["prefetch"] is not None:
+            cursor["prefetch"].cancel()
+        state["cursor"] = None
+
+    async def _next_from_cursor(
+        self,
+        cursor: Dict[str, Any],
+        slots: Dict[str, Any],
+        max_recs: int,
+        on_rec: Optional[RecCallback] = None,
+    ) -> List[Dict[str, Any]]:
+        tipo = cursor["tipo"]
+        recs: List[Dict[str, Any]] = []
+        # Los que fallaron por TMDB quedan en el buffer para el próximo
+        # "otra", pero en esta vuelta no se reintentan
+        failed: Set[int] = set()
+
+        while len(recs) < max_recs:
+            pending = [item for item in cursor["candidates"] if item["id"] not in failed]
+            if not pending:
+                if not await self._load_next_page(cursor, slots):
+                    break
+                continue
+
+            try:
+                found, used, errored = await hydrate_ranked_async(tipo, pending, max_recs - len(recs), on_rec)
+            except Exception:
+                # TMDB no respondió nada: si ya hay algo para mostrar, alcanza
+                if recs:
+                    break
+                raise
+            recs.extend(found)
+            done = set(used)
+            cursor["seen"] |= done
+            cursor["candidates"] = [item for item in cursor["candidates"] if item["id"] not in done]
+            failed |= set(errored)
+
+        self._maybe_prefetch(cursor, slots)
+        return recs
+
+    def _has_more_pages(self, cursor: Dict[str, Any]) -> bool:
+        total = cursor["total_pages"]
+        return total is None or cursor["next_page"] <= min(total, settings.results_max_pages)
+
+    async def _load_next_page(self, cursor: Dict[str, Any], slots: Dict[str, Any]) -> bool:
+        """
+        Llena el buffer con la página siguiente (o espera la que se estaba
+        trayendo en segundo plano). Devuelve False si no hay más páginas.
+        """
+        task: Optional[asyncio.Task] = cursor["prefetch"]
+        if task is not None:
+            cursor["prefetch"] = None
+            await task
+            return True
+
+        if not self._has_more_pages(cursor):
+            return False
+        await self._fetch_page(cursor, slots)
+        return True
+
+    async def _fetch_page(self, cursor: Dict[str, Any], slots: Dict[str, Any]) -> None:
+        page = cursor["next_page"]
+        cursor["next_page"] += 1
+
+        data = await discover_tmdb_async(cursor["tipo"], slots, page)
+        cursor["total_pages"] = int(data.get("total_pages") or page)
+
+        ranked = rank_candidates(data.get("results", []) or [], slots)
+        known = cursor["seen"] | {item["id"] for item in cursor["candidates"]}
+        cursor["candidates"].extend(item for item in ranked if item["id"] not in known)
+
+    def _maybe_prefetch(self, cursor: Dict[str, Any], slots: Dict[str, Any]) -> None:
+        if cursor["prefetch"] is not None or len(cursor["candidates"]) >= settings.results_low_water:
+            return
+        if not self._has_more_pages(cursor):
+            return
+
+        task = asyncio.create_task(self._fetch_page(cursor, dict(slots)))
+        # Si nadie llega a esperarla, que el error quede en el log y no se pierda
+        task.add_done_callback(_log_task_error)
+        cursor["prefetch"] = task
+
+    # -------------------------
+    # Búsqueda especulativa
+    # -------------------------
+    #
+    # Cuando lo único que falta es el contexto, la consulta a TMDB ya es
+    # la definitiva (el contexto solo reordena): se lanza en segundo plano
+    # (discover + detalles de los primeros) mientras el usuario contesta.
+    # Antes de eso cada respuesta cambia la clave y se tiraría el trabajo.
+    # Si al final la clave coincide, se reutiliza tal cual.
+
+    def _maybe_speculate(self, state: Dict[str, Any], slots: Dict[str, Any], next_question: str) -> None:
+        if not settings.prefetch_enabled or next_question != "contexto":
+            return
+
+        tipo = (slots.get("tipo_contenido") or "").lower()
+        if tipo not in ("movie", "tv") or not slots.get("generos"):
+            return
+
+        key = discover_query_key(tipo, slots)
+        current = state.get("speculative")
+        if current is not None and current["key"] == key:
+            return
+
+        self._drop_speculative(state)
+        cursor = self._new_cursor(tipo)
+        task = asyncio.create_task(self._speculate(cursor, dict(slots)))
+        task.add_done_callback(_log_task_error)
+        state["speculative"] = {"key": key, "cursor": cursor, "task": task}
+
+    async def _speculate(self, cursor: Dict[str, Any], slots: Dict[str, Any]) -> None:
+        await self._fetch_page(cursor, slots)
+        # Solo calienta el cache de detalles: el cursor no se consume
+        n = max(int(slots.get("cantidad_recs") or 1), settings.prefetch_hydrate)
+        await hydrate_ranked_async(cursor["tipo"], list(cursor["candidates"]), n)
+
+    async def _take_speculative(
+        self,
+        state: Dict[str, Any],
+        tipo: str,
+        slots: Dict[str, Any],
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve el cursor especulativo si corresponde a esta búsqueda
+        (reordenado con los slots finales), o None.
+        """
+        speculative = state.get("speculative")
+        state["speculative"] = None
+        if speculative is None:
+            return None
+
+        if speculative["key"] != discover_query_key(tipo, slots):
+            speculative["task"].cancel()
+            metrics.incr("prefetch.miss")
+            return None
+
+        try:
+            await speculative["task"]
+        except Exception:
+            metrics.incr("prefetch.miss")
+            return None
+
+        metrics.incr("prefetch.hit")
+        cursor = speculative["cursor"]
+        cursor["candidates"] = rank_candidates(cursor["candidates"], slots)
+        return cursor
+
+    def _drop_speculative(self, state: Dict[str, Any]) -> None:
+        speculative = state.get("speculative")
+        if speculative is not None:
+            speculative["task"].cancel()
+        state["speculative"] = None
+
     # -------------------------
     # Recomendaciones
     # -------------------------
 
-    def _try_recommend(self, user_id: str, reason: str = "normal") -> str:
+    async def _try_recommend(
+        self,
+        user_id: str,
+        reason: str = "normal",
+        progress: Optional[Progress] = None,
+    ) -> str:
         state = self._get_state(user_id)
         slots = state["slots"]
-        page = state["page"]
 
         tipo = (slots.get("tipo_contenido") or "movie").lower()
         if tipo not in ("movie", "tv"):
             tipo = "movie"
 
-        logger.info(f"🎯 Recomendar para user={user_id} tipo={tipo} slots={slots} page={page}")
+        max_recs = int(slots.get("cantidad_recs") or 1)
+        max_recs = max(1, min(max_recs, 5))
+
+        if progress is not None:
+            await progress("🔎 Buscando…")
+
+        # "otra" sigue con los candidatos que ya teníamos; si no, búsqueda
+        # nueva (o la especulativa, si se adelantó la misma búsqueda)
+        cursor = state.get("cursor")
+        if reason != "otra_opcion" or cursor is None or cursor["tipo"] != tipo:
+            self._drop_cursor(state)
+            cursor = await self._take_speculative(state, tipo, slots)
+            if cursor is None:
+                cursor = self._new_cursor(tipo)
+            state["cursor"] = cursor
+
+        # "otra opción" solo si de esta búsqueda ya se mostró alguna
+        # (un "otra" después de un error o de "no encontré nada" no lo es)
+        another = cursor["shown"] > 0
+
+        def intro_for(count: int) -> str:
+            if another:
+                return "Te dejo otra opción: 👇\n"
+            if count == 1:
+                return "Te dejo una recomendación 👇\n"
+            return "Mirá estas recomendaciones 👇\n"
+
+        logger.info(
+            f"🎯 Recomendar para user={user_id} tipo={tipo} slots={slots} "
+            f"buffer={len(cursor['candidates'])} next_page={cursor['next_page']}"
+        )
+
+        # Cada tarjeta se entrega apenas está lista (si hay `progress`)
+        cards: List[str] = []
+
+        async def on_rec(rec: Dict[str, Any]) -> None:
+            cards.append(self._format_rec(rec, tipo))
+            if progress is None:
+                return
+            partial = [intro_for(max_recs), *cards]
+            if len(cards) < max_recs:
+                partial.append("🔎 Buscando más…")
+            await progress(self._markdown("\n".join(partial)))
 
         try:
-            tmdb_results = discover_tmdb(tipo, slots, page)
+            recs = await self._next_from_cursor(cursor, slots, max_recs, on_rec)
         except Exception as e:
             logger.error(f"❌ Error TMDB: {e}")
             return "Error con la API, probá en un ratito."
 
-        recs = build_recommendations_from_tmdb(tipo, tmdb_results, slots)
-
-        # -----------------------------
-        # Reordenar según contexto social
-        # -----------------------------
-        contexto = slots.get("contexto")
-
-        def score_por_contexto(rec):
-            puntuacion = 0
-            genero_ids = rec.get("genre_ids", [])
-
-            # SOLO → puede ser más intenso o profundo
-            if contexto == "solo":
-                if 27 in genero_ids:  # terror
-                    puntuacion += 20
-                if 53 in genero_ids:  # suspenso
-                    puntuacion += 15
-                if 80 in genero_ids:  # crimen
-                    puntuacion += 10
-                if 18 in genero_ids:  # drama
-                    puntuacion += 8
-
-            # PAREJA → prioriza romance, drama, comedia
-            if contexto == "pareja":
-                if 10749 in genero_ids:  # romance
-                    puntuacion += 20
-                if 35 in genero_ids:  # comedia
-                    puntuacion += 12
-                if 18 in genero_ids:  # drama
-                    puntuacion += 10
-
-            # AMIGXS → prioriza comedia, acción, terror suave, cosas divertidas
-            if contexto == "amigxs":
-                if 35 in genero_ids:  # comedia
-                    puntuacion += 20
-                if 28 in genero_ids:  # acción
-                    puntuacion += 10
-                if 27 in genero_ids:  # terror
-                    puntuacion += 5  # pero no extremo
-                if 10759 in genero_ids:  # sci-fi & fantasy (series)
-                    puntuacion += 8
-
-            # FAMILIA → prioriza familiar, animación suave, aventura
-            if contexto == "familia":
-                if 10751 in genero_ids:  # familiar
-                    puntuacion += 20
-                if 16 in genero_ids:  # animación
-                    puntuacion += 10
-                if 12 in genero_ids:  # aventura
-                    puntuacion += 12
-                # penalización para contenido inapropiado
-                if 27 in genero_ids:  # terror
-                    puntuacion -= 50
-                if 53 in genero_ids:  # suspenso oscuro
-                    puntuacion -= 20
-
-            return puntuacion
-
-        # Ordenamos según esta puntuación
-        recs = sorted(recs, key=score_por_contexto, reverse=True)
-
-        # -----------------------------
-        # Penalizar contenido según restricciones
-        # -----------------------------
-        restricciones = slots.get("restricciones") or []
-
-        def penalizar_por_restricciones(rec):
-            score = 0
-            genre_ids = rec.get("genre_ids", [])
-
-            # No gore → fuerte penalización a terror/suspenso/crimen
-            if "no_gore" in restricciones:
-                if 27 in genre_ids: score -= 40   # terror
-                if 53 in genre_ids: score -= 30   # suspenso oscuro
-                if 80 in genre_ids: score -= 20   # crimen
-
-            # No terror
-            if "no_terror" in restricciones:
-                if 27 in genre_ids: score -= 100
-                # suspenso también puede molestar
-                if 53 in genre_ids: score -= 20
-
-            # No romance
-            if "no_romance" in restricciones:
-                if 10749 in genre_ids: score -= 50
-
-            # No sci-fi
-            if "no_scifi" in restricciones:
-                if 878 in genre_ids: score -= 40
-                if 14 in genre_ids: score -= 40
-
-            # No crimen
-            if "no_crimen" in restricciones:
-                if 80 in genre_ids: score -= 60
-
-            # No guerra
-            if "no_guerra" in restricciones:
-                if 10752 in genre_ids: score -= 60
-
-            # No animación → por si TMDB devolvió algo igual
-            if "no_animacion" in restricciones:
-                if 16 in genre_ids: score -= 100
-
-            return score
-
-        # Aplicamos penalización al ranking
-        recs = sorted(recs, key=lambda r: (
-            score_por_contexto(r) + penalizar_por_restricciones(r)
-        ), reverse=True)
-
-
         if not recs:
             return "Con lo que me contaste no encontré nada 😕. Probá cambiando algún filtro."
+        cursor["shown"] += len(recs)
 
-        parts = []
-        intro = "Te dejo una recomendación" if len(recs) == 1 else "Mirá estas recomendaciones"
-        if reason == "otra_opcion":
-            intro = "Te dejo otra opción:"
-
-        parts.append(intro + " 👇\n")
-
-        for rec in recs:
-            # Sanitizar texto para Markdown de Telegram
-            def sanitize_text(text):
-                if not text:
-                    return text
-                # Escapar caracteres especiales que causan problemas
-                text = text.replace("_", "\\_")
-                text = text.replace("[", "\\[")
-                text = text.replace("]", "\\]")
-                return text
-            
-            title = f"🎬 {sanitize_text(rec['title'])} ({rec['year']})"
-            genres = f"• Géneros: {sanitize_text(rec['genres'])}"
-            duration = f"• Duración: {sanitize_text(rec['duration'])}"
-
-            extras = []
-            if tipo == "tv":
-                if rec.get("seasons") is not None:
-                    extras.append(f"• Temporadas: {rec['seasons']}")
-                if rec.get("episodes") is not None:
-                    extras.append(f"• Episodios: {rec['episodes']}")
-
-            overview = rec["overview"]
-            if len(overview) > 380:
-                overview = overview[:380].rsplit(" ", 1)[0] + "..."
-            overview = sanitize_text(overview)
-
-            providers = sanitize_text(rec["providers_text"])
-
-            block = [
-                title, genres, duration, *extras, "",
-                f"📝 {overview}", "",
-                providers,
-                ""
-            ]
-            parts.append("\n".join(block))
-
+        parts = [intro_for(len(recs)), *cards]
         parts.append(
             "Si querés, podés decirme *\"otra\"* para ver más opciones con los mismos gustos,\n"
             "o cambiar algo (género, duración, cambiar a serie o peli, o decir *\"que no sea animada\"*, etc.)."
         )
 
-        response = "\n".join(parts).strip()
-        
-        response = response.replace("**", "*")  # Cambiar ** por * para evitar conflictos
-        
-        return response
\ No newline at end of file
+        return self._markdown("\n".join(parts))
+
+    @staticmethod
+    def _markdown(text: str) -> str:
+        return text.strip().replace("**", "*")  # Cambiar ** por * para evitar conflictos
+
+    @staticmethod
+    def _format_rec(rec: Dict[str, Any], tipo: str) -> str:
+        """
+        Tarjeta de una recomendación (Markdown de Telegram).
+        """
+        # Sanitizar texto para Markdown de Telegram
+        def sanitize_text(text):
+            if not text:
+                return text
+            # Escapar caracteres especiales que causan problemas
+            text = text.replace("_", "\\_")
+            text = text.replace("[", "\\[")
+            text = text.replace("]", "\\]")
+            return text
+
+        title = f"🎬 {sanitize_text(rec['title'])} ({rec['year']})"
+        genres = f"• Géneros: {sanitize_text(rec['genres'])}"
+        duration = f"• Duración: {sanitize_text(rec['duration'])}"
+
+        extras = []
+        if tipo == "tv":
+            if rec.get("seasons") is not None:
+                extras.append(f"• Temporadas: {rec['seasons']}")
+            if rec.get("episodes") is not None:
+                extras.append(f"• Episodios: {rec['episodes']}")
+
+        overview = rec["overview"]
+        if len(overview) > 380:
+            overview = overview[:380].rsplit(" ", 1)[0] + "..."
+        overview = sanitize_text(overview)
+
+        providers = sanitize_text(rec["providers_text"])
+
+        block = [
+            title, genres, duration, *extras, "",
+            f"📝 {overview}", "",
+            providers,
+            ""
+        ]
+        return "\n".join(block)
\ No newline at end of file
@@ -16,6 +16,123 @@ class Settings:
     region: str = os.getenv("REGION", "AR")
     llm_model: str = os.getenv("LLM_MODEL", "llama-3.3-70b-versatile")
 
+    # Ejecución del ChatManager en el bot: "async" (en el loop del bot) o
+    # "threads". Ojo: "threads" NO reparte el trabajo entre threads; cada
+    # worker llama a la API sync, que corre todo en el único loop
+    # "moodflix-sync-loop". CHAT_WORKERS solo limita cuántos mensajes hay
+    # en vuelo a la vez (y saca el ChatManager del loop de Telegram)
+    chat_execution_mode: str = os.getenv("CHAT_EXECUTION_MODE", "async")
+    chat_workers: int = int(os.getenv("CHAT_WORKERS", "8"))
+    # Entrega progresiva en Telegram: "buscando…" y edición por tarjeta
+    # (con un mínimo de segundos entre ediciones)
+    telegram_progressive: bool = os.getenv("TELEGRAM_PROGRESSIVE", "true").lower() in ("1", "true", "yes")
+    telegram_edit_interval: float = float(os.getenv("TELEGRAM_EDIT_INTERVAL", "0.7"))
+
+    # Pool HTTP de TMDB
+    tmdb_max_connections: int = int(os.getenv("TMDB_MAX_CONNECTIONS", "20"))
+    tmdb_max_keepalive: int = int(os.getenv("TMDB_MAX_KEEPALIVE", "10"))
+    tmdb_keepalive_expiry: float = float(os.getenv("TMDB_KEEPALIVE_EXPIRY", "30"))
+    tmdb_http2: bool = os.getenv("TMDB_HTTP2", "false").lower() in ("1", "true", "yes")
+    tmdb_timeout: float = float(os.getenv("TMDB_TIMEOUT", "10"))
+    # Timeouts por endpoint, reintentos y hedging (request duplicado tras el p95)
+    tmdb_timeout_discover: float = float(os.getenv("TMDB_TIMEOUT_DISCOVER", "5"))
+    tmdb_timeout_details: float = float(os.getenv("TMDB_TIMEOUT_DETAILS", "4"))
+    tmdb_timeout_providers: float = float(os.getenv("TMDB_TIMEOUT_PROVIDERS", "4"))
+    tmdb_retries: int = int(os.getenv("TMDB_RETRIES", "2"))
+    # Plazo total de un request (intentos + backoff, sin contar la fila del
+    # rate limiter): un reintento solo se hace si entra con al menos la
+    # mitad del timeout del endpoint. Peor caso ≈ TMDB_DEADLINE (8 s), no
+    # (TMDB_RETRIES + 1) × timeout
+    tmdb_deadline: float = float(os.getenv("TMDB_DEADLINE", "8"))
+    tmdb_backoff_base: float = float(os.getenv("TMDB_BACKOFF_BASE", "0.2"))
+    tmdb_backoff_max: float = float(os.getenv("TMDB_BACKOFF_MAX", "2"))
+    tmdb_hedge: bool = os.getenv("TMDB_HEDGE", "false").lower() in ("1", "true", "yes")
+    tmdb_hedge_default_delay: float = float(os.getenv("TMDB_HEDGE_DEFAULT_DELAY", "1"))
+    tmdb_hedge_min_delay: float = float(os.getenv("TMDB_HEDGE_MIN_DELAY", "0.05"))
+    # Tope de requests a TMDB (por segundo, para todo el proceso)
+    tmdb_rate_limit: float = float(os.getenv("TMDB_RATE_LIMIT", "40"))
+    tmdb_rate_burst: int = int(os.getenv("TMDB_RATE_BURST", "20"))
+    tmdb_rate_min: float = float(os.getenv("TMDB_RATE_MIN", "5"))
+    tmdb_max_throttle_retries: int = int(os.getenv("TMDB_MAX_THROTTLE_RETRIES", "5"))
+    # Circuit breakers (fallas seguidas para abrir, segundos abierto, llamada lenta)
+    tmdb_breaker_failures: int = int(os.getenv("TMDB_BREAKER_FAILURES", "5"))
+    tmdb_breaker_reset: float = float(os.getenv("TMDB_BREAKER_RESET", "30"))
+    tmdb_breaker_slow_call: float = float(os.getenv("TMDB_BREAKER_SLOW_CALL", "8"))
+    # Groq: timeouts (lectura / conexión), tope total por llamada
+    # (reintentos incluidos), pool y reintentos del SDK
+    groq_timeout: float = float(os.getenv("GROQ_TIMEOUT", "10"))
+    groq_deadline: float = float(os.getenv("GROQ_DEADLINE", "25"))
+    groq_connect_timeout: float = float(os.getenv("GROQ_CONNECT_TIMEOUT", "5"))
+    groq_max_connections: int = int(os.getenv("GROQ_MAX_CONNECTIONS", "10"))
+    groq_keepalive_expiry: float = float(os.getenv("GROQ_KEEPALIVE_EXPIRY", "30"))
+    groq_max_retries: int = int(os.getenv("GROQ_MAX_RETRIES", "1"))
+    # Tope de salida para la extracción de slots (el esquema compacto entra de sobra)
+    groq_slots_max_tokens: int = int(os.getenv("GROQ_SLOTS_MAX_TOKENS", "160"))
+    groq_breaker_failures: int = int(os.getenv("GROQ_BREAKER_FAILURES", "3"))
+    groq_breaker_reset: float = float(os.getenv("GROQ_BREAKER_RESET", "30"))
+    groq_breaker_slow_call: float = float(os.getenv("GROQ_BREAKER_SLOW_CALL", "15"))
+    # Buffer de candidatos por usuario para "otra": cuándo traer la página
+    # siguiente en segundo plano y hasta qué página seguir buscando
+    results_low_water: int = int(os.getenv("RESULTS_LOW_WATER", "3"))
+    results_max_pages: int = int(os.getenv("RESULTS_MAX_PAGES", "5"))
+    # Historial de conversación: backend ("jsonl" | "sqlite" | "json", el
+    # formato viejo) y archivos de cada uno
+    history_backend: str = os.getenv("HISTORY_BACKEND", "jsonl")
+    history_path: str = os.getenv("HISTORY_PATH", "data/conversation_history.jsonl")
+    history_db_path: str = os.getenv("HISTORY_DB_PATH", "data/conversation_history.sqlite3")
+    # Segmentos del JSONL: se rotan por tamaño o antigüedad (segundos), se
+    # comprimen con gzip y se borran los más viejos si el total pasa el
+    # tope (0 desactiva cada límite)
+    history_segment_max_mb: float = float(os.getenv("HISTORY_SEGMENT_MAX_MB", "64"))
+    history_segment_max_age: float = float(os.getenv("HISTORY_SEGMENT_MAX_AGE", "604800"))
+    history_max_total_mb: float = float(os.getenv("HISTORY_MAX_TOTAL_MB", "2048"))
+    # Escritura en segundo plano: tamaño de lote, segundos entre flushes,
+    # durabilidad ("async" | "fsync" | "sync") y qué hacer con la cola llena
+    # ("drop_oldest" | "block")
+    history_batch_size: int = int(os.getenv("HISTORY_BATCH_SIZE", "100"))
+    history_flush_interval: float = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))
+    history_durability: str = os.getenv("HISTORY_DURABILITY", "async")
+    history_queue_max: int = int(os.getenv("HISTORY_QUEUE_MAX", "10000"))
+    history_backpressure: str = os.getenv("HISTORY_BACKPRESSURE", "drop_oldest")
+    history_block_timeout: float = float(os.getenv("HISTORY_BLOCK_TIMEOUT", "1.0"))
+
+    # Cache de interpretaciones de Groq (extract_slots_from_text)
+    slots_cache_path: str = os.getenv("SLOTS_CACHE_PATH", "data/slots_cache.sqlite3")
+    slots_cache_ttl: float = float(os.getenv("SLOTS_CACHE_TTL", "2592000"))
+    # Tope en memoria y en disco (0 = el disco sin tope)
+    slots_cache_max_mb: int = int(os.getenv("SLOTS_CACHE_MAX_MB", "8"))
+    slots_cache_disk_max_mb: int = int(os.getenv("SLOTS_CACHE_DISK_MAX_MB", "64"))
+
+    # Extractor local: confianza mínima para no llamar a Groq (>1 lo apaga).
+    # Por defecto solo respuestas entendidas completas: lo dudoso pasa al
+    # clasificador o a Groq
+    slot_rules_min_confidence: float = float(os.getenv("SLOT_RULES_MIN_CONFIDENCE", "1.0"))
+
+    # Clasificador local entrenado con el historial (scripts/train_slot_classifier.py)
+    slot_classifier_path: str = os.getenv("SLOT_CLASSIFIER_PATH", "data/slot_classifier.json")
+    slot_classifier_min_confidence: float = float(os.getenv("SLOT_CLASSIFIER_MIN_CONFIDENCE", "0.9"))
+
+    # Búsqueda especulativa mientras se pregunta el contexto (la última)
+    prefetch_enabled: bool = os.getenv("PREFETCH_ENABLED", "true").lower() in ("1", "true", "yes")
+    prefetch_hydrate: int = int(os.getenv("PREFETCH_HYDRATE", "3"))
+    # Cuántos candidatos se hidratan en paralelo al armar recomendaciones
+    tmdb_hydration_concurrency: int = int(os.getenv("TMDB_HYDRATION_CONCURRENCY", "5"))
+
+    # Cache de respuestas TMDB (TTL en segundos)
+    tmdb_cache_max_mb: int = int(os.getenv("TMDB_CACHE_MAX_MB", "64"))
+    tmdb_ttl_discover: float = float(os.getenv("TMDB_TTL_DISCOVER", "600"))
+    tmdb_ttl_details: float = float(os.getenv("TMDB_TTL_DETAILS", "86400"))
+    tmdb_ttl_providers: float = float(os.getenv("TMDB_TTL_PROVIDERS", "21600"))
+
+    # Cache persistente en disco ("" lo desactiva; tope en MB, 0 = sin tope)
+    # y tolerancia a datos viejos
+    tmdb_disk_cache_path: str = os.getenv("TMDB_DISK_CACHE_PATH", "data/tmdb_cache.sqlite3")
+    tmdb_disk_cache_max_mb: int = int(os.getenv("TMDB_DISK_CACHE_MAX_MB", "512"))
+    tmdb_stale_while_revalidate: bool = os.getenv("TMDB_STALE_WHILE_REVALIDATE", "true").lower() in ("1", "true", "yes")
+    tmdb_stale_discover: float = float(os.getenv("TMDB_STALE_DISCOVER", "86400"))
+    tmdb_stale_details: float = float(os.getenv("TMDB_STALE_DETAILS", "604800"))
+    tmdb_stale_providers: float = float(os.getenv("TMDB_STALE_PROVIDERS", "172800"))
+
 settings = Settings()
 
 # Validaciones mínimas
@@ -28,10 +145,26 @@ if not settings.tmdb_api_key:
 if not settings.groq_api_key:
     raise RuntimeError("Falta GROQ_API_KEY en el archivo .env")
 
+if settings.chat_execution_mode not in ("async", "threads"):
+    raise RuntimeError("CHAT_EXECUTION_MODE tiene que ser 'async' o 'threads'")
+
+if settings.history_backend not in ("jsonl", "sqlite", "json"):
+    raise RuntimeError("HISTORY_BACKEND tiene que ser 'jsonl', 'sqlite' o 'json'")
+
+if settings.history_durability not in ("async", "fsync", "sync"):
+    raise RuntimeError("HISTORY_DURABILITY tiene que ser 'async', 'fsync' o 'sync'")
+
+if settings.history_backpressure not in ("drop_oldest", "block"):
+    raise RuntimeError("HISTORY_BACKPRESSURE tiene que ser 'drop_oldest' o 'block'")
+
 
-# Cliente Groq listo para usar
+# Cliente Groq sincrónico listo para usar (el bot usa app.groq_client, async)
 
-groq_client = Groq(api_key=settings.groq_api_key)
+groq_client = Groq(
+    api_key=settings.groq_api_key,
+    timeout=settings.groq_timeout,
+    max_retries=settings.groq_max_retries,
+)
 
 # Constantes TMDB
 TMDB_BASE_URL = "https://api.themoviedb.org/3"
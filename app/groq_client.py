@@ -0,0 +1,61 @@
+from __future__ import annotations
+import asyncio
+import threading
+import weakref
+
+import httpx
+from groq import AsyncGroq
+
+from .config import settings
+
+# ------------------------------
+# Cliente async de Groq
+# ------------------------------
+#
+# Timeouts explícitos (conexión y lectura), pool de conexiones reutilizado
+# entre llamadas y cancelación real: si la tarea que espera a Groq se
+# cancela, httpx corta el request y devuelve la conexión.
+
+
+def _new_groq_client() -> AsyncGroq:
+    timeout = httpx.Timeout(settings.groq_timeout, connect=settings.groq_connect_timeout)
+    http_client = httpx.AsyncClient(
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=settings.groq_max_connections,
+            max_keepalive_connections=settings.groq_max_connections,
+            keepalive_expiry=settings.groq_keepalive_expiry,
+        ),
+    )
+    return AsyncGroq(
+        api_key=settings.groq_api_key,
+        timeout=timeout,
+        max_retries=settings.groq_max_retries,
+        http_client=http_client,
+    )
+
+
+# ------------------------------
+# Un cliente por event loop
+# ------------------------------
+
+# Igual que con TMDB: las conexiones quedan atadas al loop donde se abrieron
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncGroq]" = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def get_groq_client() -> AsyncGroq:
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None:
+            client = _clients[loop] = _new_groq_client()
+    return client
+
+
+async def close_groq_client() -> None:
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.pop(loop, None)
+    if client is not None:
+        await client.close()
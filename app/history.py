@@ -0,0 +1,705 @@
+from __future__ import annotations
+from pathlib import Path
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, TextIO, Tuple
+import asyncio
+import atexit
+import gzip
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from . import metrics
+from .config import settings
+
+logger = logging.getLogger("moodflix")
+
+# ------------------------------
+# Historial de conversación
+# ------------------------------
+#
+# Guardar un turno es encolarlo; un thread lo escribe en lotes en el
+# backend elegido con HISTORY_BACKEND:
+# - "jsonl": una línea JSON por turno, solo append, en segmentos que rotan
+#   y se comprimen (por defecto).
+# - "sqlite": una tabla con índices por usuario y fecha, para consultar.
+# - "json": el formato viejo (un único JSON con los últimos 300 turnos,
+#   reescrito entero). Solo por compatibilidad.
+# El JSON viejo se sigue pudiendo leer y se migra con scripts/migrate_history.py.
+
+HISTORY_PATH = Path(settings.history_path)
+HISTORY_DB_PATH = Path(settings.history_db_path)
+LEGACY_HISTORY_PATH = Path("data/conversation_history.json")
+LEGACY_MAX_ENTRIES = 300
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+# ------------------------------
+# Backends
+# ------------------------------
+#
+# Todos tienen la misma forma: encode(entry) corre en el thread de quien
+# guarda (el turno queda como estaba en ese momento), write(lote) en el
+# thread del writer, read() recorre en orden y close() libera el archivo.
+
+class JsonlHistoryStore:
+    """
+    JSONL en segmentos: se agrega al segmento activo (el archivo de
+    HISTORY_PATH) y, cuando pasa HISTORY_SEGMENT_MAX_MB o tiene más de
+    HISTORY_SEGMENT_MAX_AGE segundos, se cierra, se renombra con la fecha de
+    su primer turno (conversation_history.20250101-120000.jsonl) y se
+    comprime con gzip. Si todo el historial pasa HISTORY_MAX_TOTAL_MB se
+    borran los segmentos más viejos. Escribir nunca depende del tamaño del
+    historial: a lo sumo se comprime un segmento cada tanto, en el thread
+    del writer.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        durability: str = "async",
+        *,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+        max_total_bytes: Optional[int] = None,
+    ) -> None:
+        self.path = path
+        self.durability = durability
+        # 0 desactiva cada límite
+        self.max_bytes = int(settings.history_segment_max_mb * 1024 * 1024) if max_bytes is None else max_bytes
+        self.max_age = settings.history_segment_max_age if max_age is None else max_age
+        self.max_total_bytes = (
+            int(settings.history_max_total_mb * 1024 * 1024) if max_total_bytes is None else max_total_bytes
+        )
+        self._file: Optional[TextIO] = None
+        # Timestamp del primer turno del segmento activo (None si está vacío)
+        self._started: Optional[float] = None
+
+    def encode(self, entry: Dict[str, Any]) -> str:
+        return _dumps(entry) + "\n"
+
+    def write(self, lines: List[str]) -> None:
+        if self._file is None or self._file.closed:
+            self._file = self._open()
+        now = time.time()
+        if self._started is not None and self.max_age and now - self._started >= self.max_age:
+            self._rotate()
+            self._file = self._open()
+        if self._started is None:
+            self._started = now
+
+        # Una sola escritura por lote: si el proceso muere a la mitad,
+        # queda a lo sumo una última línea incompleta (el lector la saltea)
+        self._file.write("".join(lines))
+        self._file.flush()
+        if self.durability == "fsync":
+            os.fsync(self._file.fileno())
+
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _open(self) -> TextIO:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Segmentos que quedaron sin comprimir si el proceso murió rotando
+        for pending in self._segments(compressed=False):
+            self._compress(pending)
+
+        # Si quedó una línea cortada de una caída anterior, la cerramos
+        # para que el próximo turno no se pegue a ella
+        torn = False
+        self._started = None
+        if self.path.exists() and self.path.stat().st_size > 0:
+            with open(self.path, "rb") as f:
+                self._started = _first_timestamp(f.readline())
+                f.seek(-1, 2)
+                torn = f.read(1) != b"\n"
+        file = open(self.path, "a", encoding="utf-8")
+        if torn:
+            file.write("\n")
+        return file
+
+    # -------------------------
+    # Segmentos
+    # -------------------------
+
+    def _segment_path(self, started: Optional[float]) -> Path:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(started or 0))
+        # Si ya hay segmentos del mismo segundo, va después del último: nunca
+        # se reusa un número que quedó libre (si no, el segmento nuevo
+        # ordenaría antes y sería el primero en borrarse por el tope)
+        taken = [n for date, n in map(self._segment_order, self._segments()) if date == stamp]
+        if not taken:
+            return self.path.with_name(f"{self.path.stem}.{stamp}{self.path.suffix}")
+        return self.path.with_name(f"{self.path.stem}.{stamp}-{max(taken) + 1}{self.path.suffix}")
+
+    def _segments(self, compressed: Optional[bool] = None) -> List[Path]:
+        """
+        Segmentos cerrados, del más viejo al más nuevo (el nombre lleva la fecha).
+        """
+        found = []
+        for candidate in self.path.parent.glob(f"{self.path.stem}.*{self.path.suffix}*"):
+            name = candidate.name
+            if candidate == self.path or name.endswith(".tmp") or name.endswith(".migrated"):
+                continue
+            is_gz = name.endswith(".gz")
+            if compressed is None or compressed == is_gz:
+                found.append(candidate)
+        return sorted(found, key=self._segment_order)
+
+    def _segment_order(self, segment: Path) -> Tuple[str, int]:
+        # "20250101-120000" y, si hubo dos en el mismo segundo, "20250101-120000-1"
+        stamp = segment.name[len(self.path.stem) + 1:].split(".")[0]
+        date, _, n = stamp.rpartition("-") if stamp.count("-") > 1 else (stamp, "", "0")
+        return date, int(n) if n.isdigit() else 0
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return
+        segment = self._segment_path(self._started)
+        self.path.replace(segment)
+        self._started = None
+        metrics.incr("history.segments.rotated")
+        self._compress(segment)
+        self._enforce_budget()
+
+    def _compress(self, segment: Path) -> None:
+        target = Path(f"{segment}.gz")
+        tmp = Path(f"{target}.tmp")
+        with open(segment, "rb") as src, gzip.open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        tmp.replace(target)
+        segment.unlink()
+        logger.info("🗜️ Segmento de historial comprimido: %s", target.name)
+
+    def _enforce_budget(self) -> None:
+        if not self.max_total_bytes:
+            return
+        segments = self._segments()
+        total = sum(p.stat().st_size for p in segments)
+        if self.path.exists():
+            total += self.path.stat().st_size
+        # El segmento activo no se borra nunca, aunque solo ya pase el tope
+        while segments and total > self.max_total_bytes:
+            oldest = segments.pop(0)
+            total -= oldest.stat().st_size
+            oldest.unlink()
+            metrics.incr("history.segments.deleted")
+            logger.warning("🧹 Historial sobre el tope de disco: borro %s", oldest.name)
+
+    def read(self) -> Iterator[Dict[str, Any]]:
+        for segment in self._segments():
+            yield from _read_jsonl(segment)
+        if self.path.exists():
+            yield from _read_jsonl(self.path)
+
+    def import_entries(self, entries: List[Dict[str, Any]]) -> None:
+        """
+        Guarda turnos viejos como un segmento comprimido con la fecha del
+        más viejo: al leer quedan antes de lo que ya hubiera.
+        """
+        if not entries:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        stamps = [e["timestamp"] for e in entries if isinstance(e.get("timestamp"), (int, float))]
+        segment = self._segment_path(min(stamps) if stamps else None)
+        target = Path(f"{segment}.gz")
+        tmp = Path(f"{target}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as out:
+            for entry in entries:
+                out.write(self.encode(entry))
+        tmp.replace(target)
+        self._enforce_budget()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SQLiteHistoryStore:
+    """
+    Historial en SQLite (modo WAL): un lote es una transacción con un solo
+    executemany. Índices por (user_id, timestamp) y por timestamp. Los
+    slots con valor quedan en JSON canónico (claves ordenadas): se pueden
+    filtrar con json_extract y agrupar para ver combinaciones frecuentes.
+
+    Las consultas (for_user, slot_combinations) usan conexiones de solo
+    lectura, una por thread: no comparten la del writer, que escribe desde
+    el thread del historial sin lock de por medio.
+    """
+
+    _COLUMNS = "user_id, timestamp, user_message, bot_response, last_question, parsed"
+
+    def __init__(self, path: Path, durability: str = "async") -> None:
+        self.path = path
+        self.durability = durability
+        self._conn: Optional[sqlite3.Connection] = None
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._conn_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        with self._conn_lock:
+            return self._connect_locked()
+
+    def _connect_locked(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # NORMAL en WAL: una caída del sistema puede perder los últimos
+            # lotes pero nunca corrompe la base (igual que el JSONL sin fsync)
+            conn.execute("PRAGMA synchronous=%s" % ("FULL" if self.durability == "fsync" else "NORMAL"))
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                " id INTEGER PRIMARY KEY,"
+                " user_id TEXT NOT NULL,"
+                " timestamp REAL NOT NULL,"
+                " user_message TEXT,"
+                " bot_response TEXT,"
+                " last_question TEXT,"
+                " intent TEXT,"
+                " source TEXT,"
+                " tipo_contenido TEXT,"
+                " slots TEXT NOT NULL DEFAULT '{}',"
+                " parsed TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS history_user_ts ON history (user_id, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS history_ts ON history (timestamp)")
+            self._conn = conn
+        return self._conn
+
+    def encode(self, entry: Dict[str, Any]) -> Tuple[Any, ...]:
+        parsed = entry.get("parsed") or {}
+        slots = {k: v for k, v in (parsed.get("slots") or {}).items() if v not in (None, "", [])}
+        return (
+            str(entry.get("user_id")),
+            entry.get("timestamp") or time.time(),
+            entry.get("user_message"),
+            entry.get("bot_response"),
+            entry.get("last_question"),
+            parsed.get("intent"),
+            parsed.get("source"),
+            slots.get("tipo_contenido"),
+            json.dumps(slots, ensure_ascii=False, sort_keys=True, separators=(",", ":")),
+            _dumps(parsed),
+        )
+
+    def write(self, rows: List[Tuple[Any, ...]]) -> None:
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT INTO history (user_id, timestamp, user_message, bot_response, last_question,"
+                " intent, source, tipo_contenido, slots, parsed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _entry(row: Tuple[Any, ...]) -> Dict[str, Any]:
+        return {
+            "user_id": row[0],
+            "timestamp": row[1],
+            "user_message": row[2],
+            "bot_response": row[3],
+            "last_question": row[4],
+            "parsed": json.loads(row[5]) if row[5] else {},
+        }
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            with self._conn_lock:
+                # La del writer crea el archivo y las tablas si todavía no están
+                self._connect_locked()
+                conn = sqlite3.connect(self.path.resolve().as_uri() + "?mode=ro", uri=True, check_same_thread=False)
+                self._readers.append(conn)
+            self._local.conn = conn
+        return conn
+
+    def read(self) -> Iterator[Dict[str, Any]]:
+        if not self.path.exists():
+            return
+        # Conexión propia: en WAL no frena al writer mientras se recorre
+        conn = sqlite3.connect(self.path)
+        try:
+            for row in conn.execute(f"SELECT {self._COLUMNS} FROM history ORDER BY timestamp, id"):
+                yield self._entry(row)
+        finally:
+            conn.close()
+
+    def for_user(
+        self,
+        user_id: str,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """
+        Turnos de un usuario entre dos fechas, los más recientes primero.
+        """
+        rows = self._reader().execute(
+            f"SELECT {self._COLUMNS} FROM history"
+            " WHERE user_id = ? AND timestamp >= ? AND timestamp < ?"
+            " ORDER BY timestamp DESC LIMIT ?",
+            (str(user_id), since or 0.0, until or float("inf"), limit),
+        ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def slot_combinations(self, since: Optional[float] = None, limit: int = 20) -> List[Tuple[Dict[str, Any], int]]:
+        """
+        Combinaciones de slots más frecuentes (sin contar turnos sin slots).
+        """
+        rows = self._reader().execute(
+            "SELECT slots, COUNT(*) AS n FROM history"
+            " WHERE timestamp >= ? AND slots != '{}'"
+            " GROUP BY slots ORDER BY n DESC LIMIT ?",
+            (since or 0.0, limit),
+        ).fetchall()
+        return [(json.loads(slots), n) for slots, n in rows]
+
+    def import_entries(self, entries: List[Dict[str, Any]]) -> None:
+        # Las filas se leen ordenadas por timestamp: no importa el orden de carga
+        self.write([self.encode(entry) for entry in entries])
+
+    def close(self) -> None:
+        with self._conn_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers = []
+            self._local = threading.local()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class LegacyJsonHistoryStore:
+    """
+    El formato original: un JSON con la lista de los últimos 300 turnos,
+    reescrito entero (ahora una vez por lote en vez de una por mensaje).
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def encode(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        # Copia: el turno queda como estaba al momento de guardarlo
+        return json.loads(_dumps(entry))
+
+    def write(self, entries: List[Dict[str, Any]]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = _read_legacy(self.path) if self.path.exists() else []
+        data.extend(entries)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data[-LEGACY_MAX_ENTRIES:], f, ensure_ascii=False, indent=2)
+        tmp.replace(self.path)
+
+    def read(self) -> Iterator[Dict[str, Any]]:
+        if self.path.exists():
+            yield from _read_legacy(self.path)
+
+    def import_entries(self, entries: List[Dict[str, Any]]) -> None:
+        raise RuntimeError("Con HISTORY_BACKEND=json no hay a dónde migrar: elegí 'jsonl' o 'sqlite'")
+
+    def close(self) -> None:
+        pass
+
+
+def make_history_store(backend: Optional[str] = None, durability: Optional[str] = None) -> Any:
+    backend = backend or settings.history_backend
+    durability = durability or settings.history_durability
+    if backend == "sqlite":
+        return SQLiteHistoryStore(HISTORY_DB_PATH, durability)
+    if backend == "json":
+        return LegacyJsonHistoryStore(LEGACY_HISTORY_PATH)
+    return JsonlHistoryStore(HISTORY_PATH, durability)
+
+
+# ------------------------------
+# Escritura en segundo plano
+# ------------------------------
+
+class HistoryWriter:
+    """
+    Escritor en segundo plano: save_conversation_history solo codifica
+    el turno y lo encola; un thread escribe la cola en lotes, cuando junta
+    HISTORY_BATCH_SIZE turnos o pasan HISTORY_FLUSH_INTERVAL segundos.
+
+    Durabilidad (HISTORY_DURABILITY):
+    - "async": cada lote se escribe y se pasa al sistema operativo (flush).
+    - "fsync": además fsync por lote (sobrevive a un corte de luz).
+    - "sync": sin cola, se escribe en el momento (como antes).
+
+    Si el disco no da abasto y la cola se llena (HISTORY_QUEUE_MAX), según
+    HISTORY_BACKPRESSURE se descarta lo más viejo ("drop_oldest") o quien
+    guarda espera hasta HISTORY_BLOCK_TIMEOUT segundos ("block") antes de
+    descartar.
+
+    "sync" y "block" pueden frenar a quien guarda: desde el event loop se
+    usa append_async, que en esos modos espera en un thread aparte.
+    """
+
+    def __init__(
+        self,
+        store: Any,
+        *,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_queue: Optional[int] = None,
+        backpressure: Optional[str] = None,
+        durability: Optional[str] = None,
+    ) -> None:
+        self.store = store
+        self.batch_size = batch_size or settings.history_batch_size
+        self.flush_interval = flush_interval or settings.history_flush_interval
+        self.max_queue = max_queue or settings.history_queue_max
+        self.backpressure = backpressure or settings.history_backpressure
+        self.durability = durability or settings.history_durability
+
+        # _lock protege el store; _cond, la cola
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._queue: Deque[Any] = deque()
+        self._thread: Optional[threading.Thread] = None
+        self._closing = False
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        record = self.store.encode(entry)
+        if self.durability == "sync":
+            self._write([record])
+            return
+
+        with self._cond:
+            if not self._closing:
+                self._enqueue(record)
+                return
+
+        # Ya se apagó el thread (ej: scripts que guardan algo al final)
+        self._write([record])
+
+    @property
+    def may_block(self) -> bool:
+        return self.durability == "sync" or self.backpressure == "block"
+
+    async def append_async(self, entry: Dict[str, Any]) -> None:
+        """
+        Como append, sin frenar el loop si el modo puede esperar al disco.
+        """
+        if self.may_block:
+            await asyncio.to_thread(self.append, entry)
+        else:
+            self.append(entry)
+
+    def _enqueue(self, record: Any) -> None:
+        # Se llama con self._cond tomado
+        self._ensure_thread()
+        if len(self._queue) >= self.max_queue and self.backpressure == "block":
+            metrics.incr("history.blocked")
+            self._cond.wait_for(
+                lambda: len(self._queue) < self.max_queue or self._closing,
+                timeout=settings.history_block_timeout,
+            )
+        if len(self._queue) >= self.max_queue:
+            self._queue.popleft()
+            metrics.incr("history.dropped")
+
+        self._queue.append(record)
+        if len(self._queue) >= self.batch_size:
+            self._cond.notify_all()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="moodflix-history", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: len(self._queue) >= self.batch_size or self._closing,
+                    timeout=self.flush_interval,
+                )
+                batch = list(self._queue)
+                self._queue.clear()
+                closing = self._closing
+                # Despierta a quien esté esperando lugar en la cola
+                self._cond.notify_all()
+
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    metrics.incr("history.errors")
+                    logger.error("❌ No se pudo escribir el historial (%d turnos perdidos): %s", len(batch), e)
+            if closing:
+                return
+
+    def _write(self, batch: List[Any]) -> None:
+        with self._lock:
+            start = time.perf_counter()
+            self.store.write(batch)
+            metrics.observe("history.flush", time.perf_counter() - start)
+        metrics.incr("history.written", len(batch))
+        metrics.incr("history.batches")
+
+    def close(self) -> None:
+        """
+        Escribe lo que quede en la cola y cierra el store.
+        """
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        with self._lock:
+            self.store.close()
+
+
+history_writer = HistoryWriter(make_history_store())
+# Scripts sync que nunca llaman a shutdown_clients igual vacían la cola
+atexit.register(history_writer.close)
+
+
+def save_conversation_history(
+    user_id: str,
+    user_text: str,
+    bot_text: str,
+    parsed: Dict[str, Any],
+    last_question: Optional[str] = None,
+) -> None:
+    """
+    Agrega un turno al historial (para analizar después y para entrenar
+    el clasificador de slots, que necesita la última pregunta).
+    """
+    history_writer.append(_history_entry(user_id, user_text, bot_text, parsed, last_question))
+
+
+async def save_conversation_history_async(
+    user_id: str,
+    user_text: str,
+    bot_text: str,
+    parsed: Dict[str, Any],
+    last_question: Optional[str] = None,
+) -> None:
+    """
+    Versión para el event loop de save_conversation_history.
+    """
+    await history_writer.append_async(_history_entry(user_id, user_text, bot_text, parsed, last_question))
+
+
+def _history_entry(
+    user_id: str,
+    user_text: str,
+    bot_text: str,
+    parsed: Dict[str, Any],
+    last_question: Optional[str],
+) -> Dict[str, Any]:
+    return {
+        "user_id": user_id,
+        "user_message": user_text,
+        "bot_response": bot_text,
+        "parsed": parsed,
+        "last_question": last_question,
+        "timestamp": time.time(),
+    }
+
+
+def close_history() -> None:
+    history_writer.close()
+
+
+# ------------------------------
+# Lectura y migración
+# ------------------------------
+
+def _first_timestamp(line: bytes) -> Optional[float]:
+    try:
+        value = json.loads(line).get("timestamp")
+    except (ValueError, AttributeError):
+        return None
+    return value if isinstance(value, (int, float)) else None
+
+
+def _read_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("⚠️ Línea %d inválida en %s, la salteo", number, path)
+
+
+def _read_legacy(path: Path) -> List[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo leer el historial viejo {path}: {e}")
+        return []
+    return data if isinstance(data, list) else []
+
+
+def read_history(path: Optional[Path] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Recorre el historial en orden. Con `path` lee ese archivo (.jsonl,
+    .jsonl.gz, .sqlite3 o el .json viejo); si no, lo que quede sin migrar del JSON
+    viejo y después el backend configurado.
+    """
+    if path is not None:
+        if path.suffix == ".json":
+            yield from _read_legacy(path) if path.exists() else []
+        elif path.suffix in (".sqlite3", ".sqlite", ".db"):
+            yield from SQLiteHistoryStore(path).read()
+        elif path.exists():
+            yield from _read_jsonl(path)
+        return
+
+    store = history_writer.store
+    if not isinstance(store, LegacyJsonHistoryStore) and LEGACY_HISTORY_PATH.exists():
+        yield from _read_legacy(LEGACY_HISTORY_PATH)
+    yield from store.read()
+
+
+def import_history(entries: List[Dict[str, Any]]) -> None:
+    """
+    Carga turnos de otro lado (JSON viejo, un JSONL) en el backend configurado.
+    """
+    # El writer no puede estar escribiendo mientras tanto
+    with history_writer._lock:
+        history_writer.store.import_entries(entries)
+
+
+def migrate_legacy_history(legacy_path: Path = LEGACY_HISTORY_PATH) -> int:
+    """
+    Pasa el historial viejo (JSON con una lista) al backend configurado.
+    El archivo viejo queda renombrado como *.migrated. Devuelve cuántos
+    turnos se migraron.
+    """
+    if not legacy_path.exists():
+        return 0
+
+    entries = _read_legacy(legacy_path)
+    import_history(entries)
+    legacy_path.replace(legacy_path.with_suffix(legacy_path.suffix + ".migrated"))
+    logger.info("📦 Historial migrado a %s (%d turnos)", settings.history_backend, len(entries))
+    return len(entries)
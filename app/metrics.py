@@ -0,0 +1,78 @@
+from __future__ import annotations
+from collections import defaultdict, deque
+from typing import Deque, Dict, Optional
+import logging
+import threading
+
+logger = logging.getLogger("moodflix")
+
+# ------------------------------
+# Contadores en memoria (thread-safe)
+# ------------------------------
+
+_lock = threading.Lock()
+_counters: Dict[str, int] = defaultdict(int)
+# Últimas N mediciones por nombre (latencias, tamaños, etc.)
+_WINDOW = 512
+_samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=_WINDOW))
+
+
+def incr(name: str, value: int = 1) -> None:
+    with _lock:
+        _counters[name] += value
+
+
+def set_value(name: str, value: int) -> None:
+    """
+    Para valores tipo "estado actual" (se pisan en vez de sumarse).
+    """
+    with _lock:
+        _counters[name] = value
+
+
+def get(name: str) -> int:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def ratio(hits: str, misses: str) -> float:
+    """
+    hits / (hits + misses), o 0.0 si todavía no hubo eventos.
+    """
+    with _lock:
+        h = _counters.get(hits, 0)
+        m = _counters.get(misses, 0)
+    return h / (h + m) if (h + m) else 0.0
+
+
+def observe(name: str, value: float) -> None:
+    with _lock:
+        _samples[name].append(value)
+
+
+def percentile(name: str, q: float, min_samples: int = 1) -> Optional[float]:
+    """
+    Percentil q (0..1) de las últimas mediciones, o None si hay pocas.
+    """
+    with _lock:
+        values = sorted(_samples.get(name, ()))
+    if len(values) < max(1, min_samples):
+        return None
+    index = min(len(values) - 1, int(q * len(values)))
+    return values[index]
+
+
+def snapshot() -> Dict[str, float]:
+    with _lock:
+        data: Dict[str, float] = dict(_counters)
+        names = list(_samples)
+    for name in names:
+        data[f"{name}.p50"] = round(percentile(name, 0.50) or 0.0, 4)
+        data[f"{name}.p95"] = round(percentile(name, 0.95) or 0.0, 4)
+    return dict(sorted(data.items()))
+
+
+def log_snapshot() -> None:
+    data = snapshot()
+    if data:
+        logger.info("📊 Métricas: %s", data)
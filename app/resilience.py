@@ -0,0 +1,213 @@
+from __future__ import annotations
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from . import metrics
+
+logger = logging.getLogger("moodflix")
+
+
+# ------------------------------
+# Reintentos
+# ------------------------------
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Backoff exponencial con "full jitter": un valor al azar entre 0 y
+    base * 2^(intento-1), con tope `cap`. Evita que todos reintenten juntos.
+    """
+    return random.uniform(0, min(cap, base * (2 ** max(0, attempt - 1))))
+
+
+# ------------------------------
+# Rate limiting
+# ------------------------------
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Header Retry-After → segundos a esperar (acepta segundos o fecha HTTP).
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RateLimiter:
+    """
+    Token bucket compartido por todo el proceso (thread-safe, sirve desde
+    cualquier event loop). Quien no consigue turno espera en vez de fallar.
+
+    Es adaptativo: con cada 429 baja la tasa a la mitad y bloquea hasta lo
+    que diga Retry-After; con cada respuesta OK la va subiendo de a poco
+    hasta `max_rate`.
+    """
+
+    def __init__(self, name: str, max_rate: float, burst: int = 1, min_rate: float = 1.0) -> None:
+        self.name = name
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.burst = max(1, burst)
+        self.rate = max_rate
+        self._lock = threading.Lock()
+        # "Theoretical arrival time" del próximo turno (GCRA)
+        self._tat = 0.0
+        self._blocked_until = 0.0
+
+    async def acquire(self) -> None:
+        delay = self._reserve()
+        if delay > 0:
+            metrics.incr(f"{self.name}.queued")
+            await asyncio.sleep(delay)
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            interval = 1.0 / self.rate
+            allowance = (self.burst - 1) * interval
+            start = max(now, self._blocked_until, self._tat - allowance)
+            self._tat = max(self._tat, start) + interval
+            return start - now
+
+    def on_throttled(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            wait = retry_after if retry_after is not None else 1.0 / self.rate
+            self._blocked_until = max(self._blocked_until, time.monotonic() + wait)
+            rate = self.rate
+        metrics.incr(f"{self.name}.throttled")
+        logger.warning("⏳ %s: 429 recibido, bajo a %.1f req/s y espero %.1fs", self.name, rate, wait)
+
+    def on_success(self) -> None:
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.02)
+
+
+# ------------------------------
+# Circuit breaker
+# ------------------------------
+
+class CircuitOpenError(RuntimeError):
+    """
+    El circuito de una dependencia está abierto: se falla sin llamarla.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker thread-safe para una dependencia externa.
+
+    - closed: todo pasa. Después de `failure_threshold` fallas seguidas
+      (errores o llamadas más lentas que `slow_call_seconds`) se abre.
+    - open: se rechaza al toque con CircuitOpenError durante `reset_timeout`.
+    - half_open: se dejan pasar `half_open_max_calls` pruebas; si salen bien
+      se cierra, si fallan se vuelve a abrir.
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        slow_call_seconds: Optional[float] = None,
+        half_open_max_calls: int = 1,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.slow_call_seconds = slow_call_seconds
+        self.half_open_max_calls = max(1, half_open_max_calls)
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """
+        ¿Se puede llamar a la dependencia ahora? En half_open reserva una prueba.
+        """
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    metrics.incr(f"{self.name}.rejected")
+                    return False
+                self._set_state(self.HALF_OPEN)
+                self._trials = 0
+
+            if self._state == self.HALF_OPEN:
+                if self._trials >= self.half_open_max_calls:
+                    metrics.incr(f"{self.name}.rejected")
+                    return False
+                self._trials += 1
+            return True
+
+    def check(self) -> None:
+        if not self.allow():
+            raise CircuitOpenError(f"Circuito {self.name} abierto")
+
+    def record_success(self, duration: Optional[float] = None) -> None:
+        if self.slow_call_seconds is not None and duration is not None and duration > self.slow_call_seconds:
+            metrics.incr(f"{self.name}.slow_call")
+            self.record_failure()
+            return
+        with self._lock:
+            self._failures = 0
+            if self._state == self.HALF_OPEN:
+                self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or (
+                self._state == self.CLOSED and self._failures >= self.failure_threshold
+            ):
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+                metrics.incr(f"{self.name}.opened")
+
+    def release(self) -> None:
+        """
+        La llamada se canceló sin resultado: libera la prueba de half_open.
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    def _set_state(self, state: str) -> None:
+        # Se llama con el lock tomado
+        if state == self._state:
+            return
+        logger.warning("🔌 Circuito %s: %s → %s", self.name, self._state, state)
+        self._state = state
+        metrics.set_value(f"{self.name}.state", self._STATE_VALUES[state])
@@ -0,0 +1,98 @@
+from __future__ import annotations
+from typing import Any, Dict, Optional
+import json
+import logging
+import re
+import time
+import unicodedata
+
+from . import metrics
+from .cache import SQLiteCache, TTLCache
+from .config import settings
+
+logger = logging.getLogger("moodflix")
+
+# ------------------------------
+# Cache de extract_slots_from_text
+# ------------------------------
+#
+# Con temperature=0 la misma respuesta a la misma pregunta da siempre el
+# mismo resultado ("pocas", "me da igual", "con amigos"...), así que se
+# guarda en memoria (LRU + TTL) y en disco para no volver a pagar Groq.
+
+# Slots previos que cambian cómo se interpreta una respuesta corta
+# (ej: "corta" es duracion_peli en una peli y temporadas en una serie)
+CONTEXT_SLOTS = ("tipo_contenido",)
+
+slots_memory_cache = TTLCache("slots.cache", max_bytes=settings.slots_cache_max_mb * 1024 * 1024)
+slots_disk_cache: Optional[SQLiteCache] = (
+    SQLiteCache("slots.disk", settings.slots_cache_path, max_bytes=settings.slots_cache_disk_max_mb * 1024 * 1024)
+    if settings.slots_cache_path
+    else None
+)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Minúsculas, sin acentos, sin emojis ni puntuación y con espacios simples.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^a-z0-9ñ\s]", " ", text)
+    return " ".join(text.split())
+
+
+def relevant_slots(
+    last_question: Optional[str],
+    prev_slots: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    Lo único de los slots previos que se le pasa a Groq (y entra en la clave).
+    """
+    prev_slots = prev_slots or {}
+    relevant = {k: prev_slots.get(k) for k in CONTEXT_SLOTS}
+    if last_question:
+        relevant[last_question] = prev_slots.get(last_question)
+    return relevant
+
+
+def slots_cache_key(
+    user_text: str,
+    last_question: Optional[str],
+    prev_slots: Optional[Dict[str, Any]],
+) -> str:
+    return json.dumps(
+        [normalize_text(user_text), last_question or "", relevant_slots(last_question, prev_slots)],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+
+
+async def get_cached_slots(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Devuelve una copia del resultado guardado (memoria y después disco), o None.
+    El disco se consulta en un thread para no frenar el loop.
+    """
+    text = slots_memory_cache.get(key)
+    if text is None and slots_disk_cache is not None:
+        row = await slots_disk_cache.aget(key)
+        if row is not None:
+            text, stored_at = row
+            remaining = stored_at + settings.slots_cache_ttl - time.time()
+            slots_memory_cache.set(key, text, remaining, size=len(text))
+
+    if text is None:
+        return None
+
+    logger.info(
+        "🧠 Slots desde cache (hit rate %.0f%%)",
+        100 * metrics.ratio("slots.cache.hit", "slots.cache.miss"),
+    )
+    return json.loads(text)
+
+
+def store_slots(key: str, parsed: Dict[str, Any]) -> None:
+    text = json.dumps(parsed, ensure_ascii=False)
+    slots_memory_cache.set(key, text, settings.slots_cache_ttl, size=len(text))
+    if slots_disk_cache is not None:
+        slots_disk_cache.set_behind(key, text, settings.slots_cache_ttl)
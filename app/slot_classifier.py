@@ -0,0 +1,252 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+import math
+import random
+
+from .slot_cache import normalize_text
+
+logger = logging.getLogger("moodflix")
+
+# ------------------------------
+# Clasificador local de intent/slots
+# ------------------------------
+#
+# Regresión logística (softmax) sobre n-gramas del mensaje, una "cabeza"
+# por salida: intent y cada slot de valor único. Se entrena con el
+# historial (mensaje + lo que devolvió Groq) usando
+# scripts/train_slot_classifier.py y se guarda como JSON.
+
+NONE = "__none__"
+
+# Slots de valor único que predice el modelo
+SLOT_HEADS = (
+    "tipo_contenido",
+    "tono",
+    "novedad",
+    "duracion_peli",
+    "temporadas",
+    "episodios_totales",
+    "duracion_capitulo",
+    "contexto",
+    "fama",
+)
+
+# Cabeza extra: ¿el mensaje trae algo que el modelo no sabe extraer
+# (listas, cantidad de recomendaciones)? Si sí, hay que ir a Groq.
+EXTRAS_HEAD = "extras"
+LIST_SLOTS = ("generos", "restricciones", "tematicas", "personas_like", "personas_dislike")
+
+# De dónde puede venir una etiqueta confiable (sin reglas, el propio modelo
+# ni los "fallback" de cuando Groq no contestó)
+LABEL_SOURCES = ("groq", "cache")
+
+
+def features(user_text: str, last_question: Optional[str]) -> List[str]:
+    """
+    Unigramas y bigramas del texto normalizado, más la última pregunta
+    sola y combinada con cada palabra (las respuestas cortas dependen de ella).
+    """
+    tokens = normalize_text(user_text).split()
+    question = last_question or "ninguna"
+    feats = [f"q:{question}", "bias"]
+    for i, token in enumerate(tokens):
+        feats.append(f"w:{token}")
+        feats.append(f"qw:{question}|{token}")
+        if i + 1 < len(tokens):
+            feats.append(f"b:{token}_{tokens[i + 1]}")
+    if not tokens:
+        feats.append("vacio")
+    return feats
+
+
+def labels_from_parsed(parsed: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Etiquetas por cabeza a partir de la salida normalizada de Groq.
+    """
+    slots = parsed.get("slots") or {}
+    labels = {"intent": str(parsed.get("intent") or "other")}
+    for slot in SLOT_HEADS:
+        value = slots.get(slot)
+        labels[slot] = value if isinstance(value, str) and value else NONE
+
+    has_extras = any(slots.get(name) for name in LIST_SLOTS)
+    if int(slots.get("cantidad_recs") or 1) != 1:
+        has_extras = True
+    labels[EXTRAS_HEAD] = "si" if has_extras else "no"
+    return labels
+
+
+def is_labelled(entry: Dict[str, Any]) -> bool:
+    """
+    ¿La entrada del historial tiene una interpretación hecha por Groq?
+    Sin "source" solo valen las entradas viejas (sin "last_question"):
+    en las nuevas, todo lo que vino de Groq tiene source.
+    """
+    parsed = entry.get("parsed") or {}
+    if not parsed:
+        return False
+    source = parsed.get("source")
+    if source is None:
+        return "last_question" not in entry
+    return source in LABEL_SOURCES
+
+
+def examples_from_history(entries: Iterable[Dict[str, Any]]) -> List[Tuple[List[str], Dict[str, str]]]:
+    """
+    (features, etiquetas) de cada entrada del historial etiquetada por Groq.
+    """
+    return [
+        (
+            features(entry.get("user_message") or "", entry.get("last_question")),
+            labels_from_parsed(entry["parsed"]),
+        )
+        for entry in entries
+        if is_labelled(entry)
+    ]
+
+
+class _Head:
+    """
+    Softmax lineal sobre features binarias (pesos dispersos por feature).
+    """
+
+    def __init__(self, classes: List[str], weights: Optional[Dict[str, List[float]]] = None) -> None:
+        self.classes = classes
+        self.weights: Dict[str, List[float]] = weights or {}
+
+    def probabilities(self, feats: List[str]) -> List[float]:
+        scores = [0.0] * len(self.classes)
+        for feat in feats:
+            row = self.weights.get(feat)
+            if row is not None:
+                for i, w in enumerate(row):
+                    scores[i] += w
+        top = max(scores)
+        exps = [math.exp(s - top) for s in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def predict(self, feats: List[str]) -> Tuple[str, float]:
+        probs = self.probabilities(feats)
+        best = max(range(len(probs)), key=probs.__getitem__)
+        return self.classes[best], probs[best]
+
+    def train_step(self, feats: List[str], label: str, lr: float, l2: float) -> None:
+        probs = self.probabilities(feats)
+        target = self.classes.index(label)
+        n = len(self.classes)
+        for feat in feats:
+            row = self.weights.setdefault(feat, [0.0] * n)
+            for i in range(n):
+                grad = probs[i] - (1.0 if i == target else 0.0)
+                row[i] -= lr * (grad + l2 * row[i])
+
+
+class SlotClassifier:
+    def __init__(self, heads: Dict[str, _Head]) -> None:
+        self.heads = heads
+
+    @classmethod
+    def train(
+        cls,
+        examples: List[Tuple[List[str], Dict[str, str]]],
+        epochs: int = 20,
+        lr: float = 0.3,
+        l2: float = 1e-4,
+        seed: int = 0,
+    ) -> "SlotClassifier":
+        def classes(name: str, default: str) -> List[str]:
+            return sorted({labels[name] for _, labels in examples} | {default})
+
+        heads = {"intent": _Head(classes("intent", "other"))}
+        for name in SLOT_HEADS:
+            heads[name] = _Head(classes(name, NONE))
+        heads[EXTRAS_HEAD] = _Head(["no", "si"])
+
+        order = list(examples)
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            step = lr / (1 + epoch * 0.5)
+            for feats, labels in order:
+                for name, head in heads.items():
+                    head.train_step(feats, labels[name], step, l2)
+        return cls(heads)
+
+    def predict(
+        self,
+        user_text: str,
+        last_question: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], float]:
+        """
+        Devuelve ({"intent": ..., "slots": {...}}, confianza). La confianza es
+        la menor probabilidad entre todas las cabezas; si el modelo cree que
+        el mensaje trae listas u otros datos que no sabe extraer, es 0.
+        """
+        feats = features(user_text, last_question)
+        confidence = 1.0
+        slots: Dict[str, Any] = {}
+
+        intent, p = self.heads["intent"].predict(feats)
+        confidence = min(confidence, p)
+
+        extras, p = self.heads[EXTRAS_HEAD].predict(feats)
+        if extras == "si":
+            return {"intent": intent, "slots": {}}, 0.0
+        confidence = min(confidence, p)
+
+        for name in SLOT_HEADS:
+            value, p = self.heads[name].predict(feats)
+            confidence = min(confidence, p)
+            if value != NONE:
+                slots[name] = value
+
+        return {"intent": intent, "slots": slots}, confidence
+
+    # -------------------------
+    # Persistencia
+    # -------------------------
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            name: {
+                "classes": head.classes,
+                # Redondeado: el archivo queda mucho más chico sin perder nada útil
+                "weights": {f: [round(w, 4) for w in row] for f, row in head.weights.items()},
+            }
+            for name, head in self.heads.items()
+        }
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "SlotClassifier":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls({name: _Head(head["classes"], head["weights"]) for name, head in data.items()})
+
+
+_model: Optional[SlotClassifier] = None
+_model_loaded = False
+
+
+def get_slot_classifier(path: Optional[str]) -> Optional[SlotClassifier]:
+    """
+    Modelo entrenado (se carga una sola vez), o None si no hay archivo.
+    """
+    global _model, _model_loaded
+    if not _model_loaded:
+        _model_loaded = True
+        if path and Path(path).exists():
+            try:
+                _model = SlotClassifier.load(Path(path))
+                logger.info("🤖 Clasificador de slots cargado desde %s", path)
+            except Exception as e:
+                logger.warning("⚠️ No se pudo cargar el clasificador de slots: %s", e)
+    return _model
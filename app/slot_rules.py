@@ -0,0 +1,196 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+
+from .slot_cache import normalize_text
+
+# ------------------------------
+# Extractor local de slots (sin LLM)
+# ------------------------------
+#
+# Aplica las mismas tablas de sinónimos que el prompt de Groq, pero solo
+# para respuestas cortas a la última pregunta y para restricciones
+# explícitas ("que no sea animada"). Todo lo demás (mensajes libres,
+# negaciones, respuestas que mezclan varios slots) se deja para Groq.
+
+# Valores posibles por slot: valor -> frases (ya normalizadas)
+SLOT_PHRASES: Dict[str, Dict[str, List[str]]] = {
+    "tipo_contenido": {
+        "movie": ["pelicula", "peliculas", "peli", "pelis", "film"],
+        "tv": ["serie", "series"],
+    },
+    "temporadas": {
+        "pocas": ["pocas", "pocas temporadas", "una temporada", "corta", "cortas"],
+        "varias": ["varias", "varias temporadas", "muchas", "muchas temporadas", "larga", "largas"],
+    },
+    "episodios_totales": {
+        "pocos": ["pocos", "pocos capitulos", "menos de 30"],
+        "muchos": ["muchos", "muchos capitulos", "30 o mas", "mas de 30"],
+    },
+    "duracion_capitulo": {
+        "cortos": ["cortos", "cortitos", "cortito", "corto", "20 minutos", "30 minutos"],
+        "largos": ["largos", "largo", "45 minutos", "una hora"],
+    },
+    "duracion_peli": {
+        "corta": ["corta", "cortita", "corto"],
+        "larga": ["larga", "largo"],
+    },
+    "novedad": {
+        "nuevo": ["nuevo", "nueva", "moderno", "moderna", "reciente", "actual"],
+        "clasico": ["clasico", "clasica", "viejo", "vieja", "antiguo", "antigua"],
+    },
+    "fama": {
+        "conocida": ["conocida", "conocido", "muy conocida", "muy conocido", "popular", "famosa", "famoso"],
+        "joyita": ["joyita", "joya oculta", "poco conocida", "poco conocido", "poco vista", "poco visto"],
+    },
+    "contexto": {
+        "solo": ["solo", "sola", "solito", "solita"],
+        "pareja": ["pareja", "novio", "novia"],
+        "amigxs": ["amigos", "amigas", "amigxs", "amigues"],
+        "familia": ["familia", "familiar"],
+    },
+}
+
+# Géneros (mismos nombres que MOVIE_GENRES / TV_GENRES)
+GENRE_PHRASES: Dict[str, List[str]] = {
+    "acción": ["accion"],
+    "aventura": ["aventura", "aventuras"],
+    "animación": ["animacion", "animada", "animadas"],
+    "comedia": ["comedia", "comedias"],
+    "crimen": ["crimen", "policial", "policiales"],
+    "documental": ["documental", "documentales"],
+    "drama": ["drama", "dramas"],
+    "fantasía": ["fantasia"],
+    "terror": ["terror", "horror"],
+    "misterio": ["misterio"],
+    "romance": ["romance", "romantica", "romanticas"],
+    "ciencia ficción": ["ciencia ficcion", "sci fi"],
+    "thriller": ["thriller", "suspenso"],
+}
+
+RESTRICTION_SUBJECTS: Dict[str, List[str]] = {
+    "no_animacion": ["animada", "animadas", "animacion", "dibujitos"],
+    "no_terror": ["terror", "miedo"],
+    "no_gore": ["gore", "sangre"],
+    "no_romance": ["romance", "romantica"],
+    "no_scifi": ["sci fi", "ciencia ficcion", "fantasia"],
+    "no_crimen": ["crimen", "policiales", "policial"],
+    "no_guerra": ["guerra", "belica", "belicas"],
+}
+
+INDIFFERENCE_PHRASES: List[str] = [
+    "me da igual", "da igual", "igual", "indiferente", "no se", "ni idea",
+    "cualquiera", "cualquiera de las dos", "como quieras", "lo que quieras",
+    "lo que vos digas", "no tengo preferencia", "sin preferencia",
+    "me es indistinto", "indistinto", "me da lo mismo", "da lo mismo",
+    "lo mismo", "ambas", "las dos", "los dos",
+]
+
+# Palabras de relleno que no cambian el sentido de una respuesta corta
+FILLER_WORDS = frozenset(
+    "a algo bastante bien con creo dale de el en la las lo los mas me mejor mi mis "
+    "prefiero preferiria que quiero sea sean si una uno un ver ponele porfa "
+    "por favor tipo y".split()
+)
+
+# Si alguna de estas queda sin interpretar, la frase es ambigua para las reglas
+AMBIGUOUS_WORDS = frozenset(("no", "ni", "sin", "nada", "pero", "aunque", "excepto", "menos"))
+
+# Respuestas más largas que esto ya son mensajes libres
+MAX_WORDS = 12
+
+# Preguntas con un único valor posible (generos es lista, va aparte)
+SINGLE_VALUE_SLOTS = frozenset(SLOT_PHRASES)
+
+
+def _restriction_phrases() -> Dict[str, List[str]]:
+    phrases: Dict[str, List[str]] = {}
+    for value, subjects in RESTRICTION_SUBJECTS.items():
+        phrases[value] = [
+            f"{prefix} {subject}"
+            for subject in subjects
+            for prefix in ("no", "sin", "nada de", "no sea", "no sean", "que no sea", "que no sean")
+        ]
+    return phrases
+
+
+RESTRICTION_PHRASES = _restriction_phrases()
+
+
+def _match(
+    tokens: List[str],
+    consumed: List[bool],
+    table: Dict[str, List[str]],
+) -> List[str]:
+    """
+    Busca las frases de la tabla (de más larga a más corta) sobre los tokens
+    todavía libres. Devuelve los valores encontrados en orden de aparición.
+    """
+    candidates = sorted(
+        ((phrase.split(), value) for value, phrases in table.items() for phrase in phrases),
+        key=lambda item: len(item[0]),
+        reverse=True,
+    )
+    found: List[Tuple[int, str]] = []
+    for words, value in candidates:
+        size = len(words)
+        for start in range(len(tokens) - size + 1):
+            if any(consumed[start:start + size]):
+                continue
+            if tokens[start:start + size] == words:
+                for i in range(start, start + size):
+                    consumed[i] = True
+                found.append((start, value))
+    return [value for _, value in sorted(found)]
+
+
+def extract_slots_by_rules(
+    user_text: str,
+    last_question: Optional[str],
+) -> Optional[Tuple[Dict[str, Any], float]]:
+    """
+    Interpreta respuestas cortas sin llamar al LLM.
+
+    Devuelve ({"intent": ..., "slots": {...}}, confianza) o None si el
+    mensaje no se puede resolver con reglas. La confianza es la fracción
+    de palabras que las reglas entendieron (relleno incluido).
+    """
+    tokens = normalize_text(user_text).split()
+    if not tokens or len(tokens) > MAX_WORDS:
+        return None
+
+    consumed = [False] * len(tokens)
+    slots: Dict[str, Any] = {}
+
+    # Las restricciones explícitas valen en cualquier momento
+    restricciones = _match(tokens, consumed, RESTRICTION_PHRASES)
+    if restricciones:
+        slots["restricciones"] = list(dict.fromkeys(restricciones))
+
+    if last_question == "generos":
+        generos = _match(tokens, consumed, GENRE_PHRASES)
+        if generos:
+            slots["generos"] = list(dict.fromkeys(generos))
+
+    elif last_question in SINGLE_VALUE_SLOTS:
+        values = set(_match(tokens, consumed, SLOT_PHRASES[last_question]))
+        if _match(tokens, consumed, {"indiferente": INDIFFERENCE_PHRASES}):
+            values.add("indiferente")
+        if len(values) > 1:
+            # "corta o larga", "solo o con amigos": que decida Groq
+            return None
+        if values:
+            slots[last_question] = values.pop()
+
+    if not slots:
+        return None
+
+    understood = 0
+    for token, used in zip(tokens, consumed):
+        if used:
+            understood += 1
+        elif token in AMBIGUOUS_WORDS:
+            return None
+        elif token in FILLER_WORDS:
+            understood += 1
+
+    return {"intent": "answer", "slots": slots}, understood / len(tokens)
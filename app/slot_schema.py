@@ -0,0 +1,118 @@
+from __future__ import annotations
+from typing import Any, Dict, Optional, Tuple
+import json
+import re
+
+# ------------------------------
+# Esquema compacto de la salida de Groq
+# ------------------------------
+#
+# El modelo responde con claves cortas ({"i":"a","s":{"te":"pocas"}}) para
+# generar menos tokens; acá se valida y se expande al formato largo que usa
+# el resto del bot ({"intent": "answer", "slots": {"temporadas": "pocas"}}).
+
+INTENTS = {"r": "recommendation", "a": "answer", "o": "other"}
+
+# clave corta -> (slot, valores válidos o None si es lista de textos)
+SLOT_KEYS: Dict[str, Tuple[str, Optional[Tuple[str, ...]]]] = {
+    "tc": ("tipo_contenido", ("movie", "tv", "indiferente")),
+    "g": ("generos", None),
+    "to": ("tono", ("liviano", "intenso", "emocional", "indiferente")),
+    "n": ("novedad", ("nuevo", "clasico", "indiferente")),
+    "dp": ("duracion_peli", ("corta", "larga", "indiferente")),
+    "te": ("temporadas", ("pocas", "varias", "indiferente")),
+    "ep": ("episodios_totales", ("pocos", "muchos", "indiferente")),
+    "dc": ("duracion_capitulo", ("cortos", "largos", "indiferente")),
+    "cx": ("contexto", ("solo", "pareja", "amigxs", "familia", "indiferente")),
+    "f": ("fama", ("conocida", "joyita", "indiferente")),
+    "r": ("restricciones", None),
+    "pl": ("personas_like", None),
+    "pd": ("personas_dislike", None),
+    "tm": ("tematicas", None),
+    "c": ("cantidad_recs", ()),
+}
+
+MAX_RECS = 5
+
+# Descripción del esquema para los prompts (fija: no rompe el cache de prefijo)
+SCHEMA_TEXT = (
+    '{"i":"r|a|o","s":{...}} con i = r (pide recomendación o cambia peli/serie), '
+    "a (responde la última pregunta), o (otra cosa).\n"
+    "Claves de s (SOLO las mencionadas):\n"
+    + "\n".join(
+        f"{short}={slot}: "
+        + (
+            "número 1-5" if values == ()
+            else "lista de textos" if values is None
+            else "|".join(values)
+        )
+        for short, (slot, values) in SLOT_KEYS.items()
+    )
+)
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def _load_json(content: str) -> Any:
+    """
+    json.loads tolerante a fences ``` y a texto alrededor del objeto.
+    """
+    cleaned = content.strip()
+    if cleaned.startswith("```"):
+        cleaned = re.sub(r"^```[a-zA-Z]*\s*", "", cleaned)
+        cleaned = re.sub(r"\s*```$", "", cleaned)
+    try:
+        return json.loads(cleaned)
+    except json.JSONDecodeError:
+        start, end = cleaned.find("{"), cleaned.rfind("}")
+        if start == -1 or end <= start:
+            raise SchemaError("no es JSON")
+        try:
+            return json.loads(cleaned[start:end + 1])
+        except json.JSONDecodeError as e:
+            raise SchemaError(f"JSON inválido: {e.msg}") from None
+
+
+def decode_slots_output(content: str) -> Dict[str, Any]:
+    """
+    Valida la respuesta compacta y la devuelve en formato largo.
+    Levanta SchemaError con un motivo corto (sirve para el pedido de reparación).
+    """
+    data = _load_json(content)
+    if not isinstance(data, dict):
+        raise SchemaError("la raíz tiene que ser un objeto")
+
+    intent = INTENTS.get(data.get("i"))
+    if intent is None:
+        raise SchemaError(f'"i" tiene que ser r, a u o (vino {data.get("i")!r})')
+
+    raw_slots = data.get("s") or {}
+    if not isinstance(raw_slots, dict):
+        raise SchemaError('"s" tiene que ser un objeto')
+
+    slots: Dict[str, Any] = {}
+    for short, value in raw_slots.items():
+        if short not in SLOT_KEYS:
+            # Claves de más no invalidan la respuesta: se ignoran
+            continue
+        slot, allowed = SLOT_KEYS[short]
+        if value is None or value == "" or value == []:
+            continue
+        if allowed == ():
+            if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+                raise SchemaError(f'"{short}" tiene que ser un número entre 1 y {MAX_RECS}')
+            slots[slot] = min(value, MAX_RECS)
+        elif allowed is None:
+            if isinstance(value, str):
+                value = [value]
+            if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                raise SchemaError(f'"{short}" tiene que ser una lista de textos')
+            slots[slot] = value
+        else:
+            if value not in allowed:
+                raise SchemaError(f'"{short}" tiene que ser {"|".join(allowed)} (vino {value!r})')
+            slots[slot] = value
+
+    return {"intent": intent, "slots": slots}
@@ -0,0 +1,554 @@
+from __future__ import annotations
+from typing import Any, Dict, Optional, Set, Tuple
+from urllib.parse import urlencode
+import asyncio
+import json
+import logging
+import re
+import threading
+import time
+import weakref
+
+import httpx
+
+from . import metrics
+from .cache import SQLiteCache, TTLCache
+from .config import settings, TMDB_BASE_URL
+from .resilience import CircuitBreaker, CircuitOpenError, RateLimiter, backoff_delay, parse_retry_after
+
+logger = logging.getLogger("moodflix")
+
+
+# ------------------------------
+# Cache de respuestas
+# ------------------------------
+
+# Compartidos entre todos los clientes (y event loops) del proceso.
+# En memoria las entradas son (data, stored_at); en disco, el JSON crudo.
+tmdb_cache = TTLCache("tmdb.cache", max_bytes=settings.tmdb_cache_max_mb * 1024 * 1024)
+tmdb_disk_cache: Optional[SQLiteCache] = (
+    SQLiteCache("tmdb.disk", settings.tmdb_disk_cache_path, max_bytes=settings.tmdb_disk_cache_max_mb * 1024 * 1024)
+    if settings.tmdb_disk_cache_path
+    else None
+)
+
+# Un solo limitador para todo el proceso (TMDB limita por API key)
+tmdb_rate_limiter = RateLimiter(
+    "tmdb.rate",
+    max_rate=settings.tmdb_rate_limit,
+    burst=settings.tmdb_rate_burst,
+    min_rate=settings.tmdb_rate_min,
+)
+
+tmdb_breaker = CircuitBreaker(
+    "tmdb.breaker",
+    failure_threshold=settings.tmdb_breaker_failures,
+    reset_timeout=settings.tmdb_breaker_reset,
+    slow_call_seconds=settings.tmdb_breaker_slow_call,
+)
+
+_DETAILS_PATH = re.compile(r"^/(movie|tv)/\d+$")
+
+
+def cache_key(path: str, params: Dict[str, Any]) -> str:
+    """
+    path + params ordenados (sin api_key), para que el orden no cambie la clave.
+    """
+    items = sorted((k, str(v)) for k, v in params.items() if k != "api_key")
+    return f"{path}?{urlencode(items)}"
+
+
+def ttl_for(path: str, params: Optional[Dict[str, Any]] = None) -> float:
+    """
+    TTL según endpoint: corto para búsquedas, largo para detalles,
+    intermedio para plataformas. Si los detalles traen las plataformas
+    embebidas (append_to_response), manda el TTL de plataformas.
+    """
+    return _cache_policy(path, params)[0]
+
+
+def max_stale_for(path: str, params: Optional[Dict[str, Any]] = None) -> float:
+    """
+    Cuánto tiempo después del TTL se puede seguir sirviendo una respuesta
+    vieja (mientras se refresca, o si TMDB falla).
+    """
+    return _cache_policy(path, params)[1]
+
+
+def endpoint_kind(path: str) -> str:
+    """
+    Agrupa los paths de TMDB: "providers", "details" o "discover" (búsquedas y resto).
+    """
+    if path.endswith("/watch/providers"):
+        return "providers"
+    if _DETAILS_PATH.match(path):
+        return "details"
+    return "discover"
+
+
+def timeout_for(path: str) -> float:
+    kind = endpoint_kind(path)
+    if kind == "providers":
+        return settings.tmdb_timeout_providers
+    if kind == "details":
+        return settings.tmdb_timeout_details
+    return settings.tmdb_timeout_discover
+
+
+def _cache_policy(path: str, params: Optional[Dict[str, Any]]) -> Tuple[float, float]:
+    kind = endpoint_kind(path)
+    if kind == "providers":
+        return settings.tmdb_ttl_providers, settings.tmdb_stale_providers
+    if kind == "details":
+        appended = str((params or {}).get("append_to_response", ""))
+        if "watch/providers" in appended:
+            return (
+                min(settings.tmdb_ttl_details, settings.tmdb_ttl_providers),
+                min(settings.tmdb_stale_details, settings.tmdb_stale_providers),
+            )
+        return settings.tmdb_ttl_details, settings.tmdb_stale_details
+    return settings.tmdb_ttl_discover, settings.tmdb_stale_discover
+
+
+class _Deadline:
+    """
+    Tiempo total que le queda a un request a TMDB (intentos + backoff).
+    La espera en la fila del rate limiter no cuenta: corre el plazo.
+    """
+
+    __slots__ = ("until",)
+
+    def __init__(self, seconds: float) -> None:
+        self.until = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.until - time.monotonic()
+
+    def extend(self, seconds: float) -> None:
+        self.until += seconds
+
+    def copy(self) -> "_Deadline":
+        clone = _Deadline(0)
+        clone.until = self.until
+        return clone
+
+
+class _Flight:
+    """
+    Un request a TMDB en vuelo y cuántos lo están esperando.
+    """
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class TMDBClient:
+    """
+    Cliente HTTP compartido para TMDB.
+
+    Mantiene un pool de conexiones con keep-alive (y HTTP/2 opcional),
+    así cada request reutiliza una conexión abierta en vez de pagar
+    TCP + TLS de nuevo.
+
+    Las respuestas se guardan en `cache` (memoria) y `disk_cache` (SQLite);
+    por default los compartidos del proceso, None los desactiva. Una
+    respuesta vencida pero dentro de max_stale se sirve al toque y se
+    refresca en segundo plano; si TMDB falla, también se usa la vieja.
+    Requests idénticos concurrentes se resuelven con una sola llamada, y
+    todas las llamadas pasan por el `rate_limiter` y el `breaker` del proceso.
+    """
+
+    def __init__(
+        self,
+        base_url: str = TMDB_BASE_URL,
+        api_key: Optional[str] = None,
+        *,
+        max_connections: Optional[int] = None,
+        max_keepalive: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        http2: Optional[bool] = None,
+        timeout: Optional[float] = None,
+        cache: Optional[TTLCache] = tmdb_cache,
+        disk_cache: Optional[SQLiteCache] = tmdb_disk_cache,
+        rate_limiter: Optional[RateLimiter] = tmdb_rate_limiter,
+        breaker: Optional[CircuitBreaker] = tmdb_breaker,
+        hedge: Optional[bool] = None,
+    ) -> None:
+        self.base_url = base_url
+        self.api_key = api_key if api_key is not None else settings.tmdb_api_key
+        self.limits = httpx.Limits(
+            max_connections=max_connections or settings.tmdb_max_connections,
+            max_keepalive_connections=max_keepalive or settings.tmdb_max_keepalive,
+            keepalive_expiry=keepalive_expiry or settings.tmdb_keepalive_expiry,
+        )
+        self.timeout = timeout or settings.tmdb_timeout
+
+        self.http2 = settings.tmdb_http2 if http2 is None else http2
+        if self.http2 and not _http2_available():
+            logger.warning("⚠️ HTTP/2 pedido para TMDB pero falta el paquete 'h2'; uso HTTP/1.1")
+            self.http2 = False
+
+        self.cache = cache
+        self.disk_cache = disk_cache
+        self.rate_limiter = rate_limiter
+        self.breaker = breaker
+        self.hedge = settings.tmdb_hedge if hedge is None else hedge
+        self._client: Optional[httpx.AsyncClient] = None
+        # Single-flight: clave -> request en vuelo (compartido entre quienes lo piden)
+        self._inflight: Dict[str, _Flight] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    def open(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+            )
+        return self._client
+
+    async def get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        GET a TMDB con logging. Devuelve el JSON ya parseado
+        (desde el cache si hay una respuesta utilizable).
+        """
+        if not self.api_key:
+            raise RuntimeError("TMDB_API_KEY no configurada")
+
+        key = cache_key(path, params)
+        ttl = ttl_for(path, params)
+        max_stale = max_stale_for(path, params)
+
+        entry = await self._lookup(key, ttl + max_stale)
+        if entry is not None:
+            data, stored_at = entry
+            if time.time() - stored_at < ttl:
+                return data
+            if settings.tmdb_stale_while_revalidate:
+                # Vieja pero tolerable: se sirve ya y se refresca atrás
+                metrics.incr("tmdb.stale_served")
+                self._refresh_in_background(key, path, params)
+                return data
+
+        try:
+            return await self._fetch_shared(key, path, params)
+        except (httpx.HTTPError, ValueError, CircuitOpenError) as e:
+            if entry is None:
+                raise
+            metrics.incr("tmdb.stale_if_error")
+            logger.warning("⚠️ TMDB falló (%s); uso respuesta cacheada vieja de %s", e, path)
+            return entry[0]
+
+    async def _lookup(self, key: str, max_age: float) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Busca primero en memoria y después en disco (y sube a memoria lo del disco).
+        El disco se consulta en un thread para no frenar el loop.
+        """
+        if self.cache is not None:
+            entry = self.cache.get(key)
+            if entry is not None:
+                return entry
+
+        if self.disk_cache is None:
+            return None
+
+        row = await self.disk_cache.aget(key)
+        if row is None:
+            return None
+
+        text, stored_at = row
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return None
+        if self.cache is not None:
+            remaining = stored_at + max_age - time.time()
+            self.cache.set(key, (data, stored_at), remaining, size=len(text))
+        return data, stored_at
+
+    async def _fetch_shared(self, key: str, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Requests idénticos en vuelo comparten una sola llamada a la red
+        (y el mismo resultado parseado). Si quien lo pidió primero se
+        cancela, el request sigue para los demás; si se cancelan todos,
+        se cancela también el request.
+        """
+        flight = self._inflight.get(key)
+        if flight is None:
+            task = asyncio.create_task(self._fetch_and_store(key, path, params))
+            flight = self._inflight[key] = _Flight(task)
+            task.add_done_callback(lambda t: self._on_fetch_done(key, t))
+        else:
+            metrics.incr("tmdb.coalesced")
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                # Era el último interesado: no tiene sentido seguir
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _on_fetch_done(self, key: str, task: asyncio.Task) -> None:
+        flight = self._inflight.get(key)
+        if flight is not None and flight.task is task:
+            del self._inflight[key]
+        # Si nadie quedó esperando, que el error no quede como "never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch_and_store(self, key: str, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        resp = await self._request_with_breaker(path, params)
+        data = resp.json()
+
+        max_age = ttl_for(path, params) + max_stale_for(path, params)
+        stored_at = time.time()
+        if self.cache is not None:
+            self.cache.set(key, (data, stored_at), max_age, size=len(resp.content))
+        if self.disk_cache is not None:
+            # Write-behind: la respuesta no espera al disco
+            self.disk_cache.set_behind(key, resp.text, max_age, stored_at=stored_at)
+        return data
+
+    async def _request_with_breaker(self, path: str, params: Dict[str, Any]) -> httpx.Response:
+        """
+        Con el circuito abierto falla al toque (CircuitOpenError). Los 4xx
+        no cuentan como falla: TMDB respondió, el problema es el pedido.
+        Un 429 no cuenta para ningún lado (es nuestro ritmo, y ya lo frena
+        el rate limiter).
+
+        La lentitud se mide solo sobre el request de red que respondió
+        (resp.elapsed): la fila del rate limiter, Retry-After y el backoff
+        entre reintentos no hacen "lento" a TMDB.
+        """
+        if self.breaker is None:
+            return await self._request(path, params)
+
+        self.breaker.check()
+        try:
+            resp = await self._request(path, params)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 429:
+                self.breaker.release()
+            elif e.response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.breaker.record_success(resp.elapsed.total_seconds())
+        return resp
+
+    async def _request(self, path: str, params: Dict[str, Any]) -> httpx.Response:
+        """
+        GET a la red con timeout por endpoint, respetando el rate limiter.
+
+        - 429: no se propaga; se frena el limitador (Retry-After) y el
+          request vuelve a la fila.
+        - Timeouts, errores de red y 5xx: se reintenta (es un GET, es
+          idempotente) con backoff exponencial + jitter, siempre que el
+          reintento entre en TMDB_DEADLINE con al menos la mitad del
+          timeout del endpoint.
+        """
+        full_params = {"api_key": self.api_key, **params}
+        kind = endpoint_kind(path)
+        timeout = timeout_for(path)
+        deadline = _Deadline(settings.tmdb_deadline)
+
+        def retry_delay(attempt: int) -> Optional[float]:
+            if attempt >= settings.tmdb_retries:
+                return None
+            delay = backoff_delay(attempt + 1, settings.tmdb_backoff_base, settings.tmdb_backoff_max)
+            if deadline.remaining() - delay < timeout / 2:
+                metrics.incr("tmdb.deadline")
+                return None
+            return delay
+
+        attempt = 0
+        throttled = 0
+        while True:
+            try:
+                resp = await self._send_hedged(path, full_params, timeout, kind, deadline)
+            except httpx.TransportError as e:
+                delay = retry_delay(attempt)
+                if delay is None:
+                    metrics.incr("tmdb.failed")
+                    raise
+                attempt += 1
+                metrics.incr("tmdb.retry")
+                logger.warning("🔁 TMDB %s falló (%s), reintento %d", path, type(e).__name__, attempt)
+                await asyncio.sleep(delay)
+                continue
+
+            if resp.status_code == 429 and throttled < settings.tmdb_max_throttle_retries:
+                throttled += 1
+                if self.rate_limiter is not None:
+                    self.rate_limiter.on_throttled(parse_retry_after(resp.headers.get("Retry-After")))
+                else:
+                    await asyncio.sleep(parse_retry_after(resp.headers.get("Retry-After")) or 1.0)
+                continue
+
+            if resp.status_code >= 500:
+                delay = retry_delay(attempt)
+                if delay is not None:
+                    attempt += 1
+                    metrics.incr("tmdb.retry")
+                    logger.warning("🔁 TMDB %s respondió %d, reintento %d", path, resp.status_code, attempt)
+                    await asyncio.sleep(delay)
+                    continue
+
+            resp.raise_for_status()
+            if self.rate_limiter is not None:
+                self.rate_limiter.on_success()
+            return resp
+
+    async def _send(
+        self,
+        path: str,
+        full_params: Dict[str, Any],
+        timeout: float,
+        kind: str,
+        deadline: Optional[_Deadline] = None,
+    ) -> httpx.Response:
+        if self.rate_limiter is not None:
+            queued = time.monotonic()
+            await self.rate_limiter.acquire()
+            if deadline is not None:
+                deadline.extend(time.monotonic() - queued)
+        if deadline is not None:
+            # El intento no puede pasarse del plazo total (mínimo simbólico
+            # para no mandar un timeout negativo)
+            timeout = max(0.05, min(timeout, deadline.remaining()))
+
+        logger.info("🎬 TMDB GET → %s%s | params=%s", self.base_url, path,
+                    {k: v for k, v in full_params.items() if k != "api_key"})
+
+        start = time.perf_counter()
+        resp = await self.open().get(path, params=full_params, timeout=timeout)
+        metrics.observe(f"tmdb.latency.{kind}", time.perf_counter() - start)
+        return resp
+
+    async def _send_hedged(
+        self,
+        path: str,
+        full_params: Dict[str, Any],
+        timeout: float,
+        kind: str,
+        deadline: Optional[_Deadline] = None,
+    ) -> httpx.Response:
+        """
+        Si el hedging está activo y la respuesta tarda más que el p95 del
+        endpoint, se manda un segundo request igual y gana el primero que
+        responda bien.
+        """
+        if not self.hedge:
+            return await self._send(path, full_params, timeout, kind, deadline)
+
+        primary = asyncio.create_task(self._send(path, full_params, timeout, kind, deadline))
+        hedge: Optional[asyncio.Task] = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self._hedge_delay(kind))
+            if done:
+                return primary.result()
+
+            metrics.incr("tmdb.hedge.sent")
+            # El hedge corre sobre una copia: su espera en el rate limiter
+            # no puede volver a correr el plazo que ya corrió el primario
+            hedge_deadline = deadline.copy() if deadline is not None else None
+            hedge = asyncio.create_task(self._send(path, full_params, timeout, kind, hedge_deadline))
+            pending = {primary, hedge}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            metrics.incr("tmdb.hedge.won")
+                        return task.result()
+                    error = task.exception()
+            # Fallaron los dos
+            raise error or RuntimeError("hedging sin resultado")
+        finally:
+            for task in (primary, hedge):
+                if task is not None:
+                    task.cancel()
+
+    def _hedge_delay(self, kind: str) -> float:
+        p95 = metrics.percentile(f"tmdb.latency.{kind}", 0.95, min_samples=20)
+        if p95 is None:
+            return settings.tmdb_hedge_default_delay
+        return max(settings.tmdb_hedge_min_delay, p95)
+
+    def _refresh_in_background(self, key: str, path: str, params: Dict[str, Any]) -> None:
+        if key in self._inflight:
+            return
+
+        async def refresh() -> None:
+            try:
+                await self._fetch_shared(key, path, params)
+                metrics.incr("tmdb.refreshed")
+            except Exception as e:
+                logger.warning("⚠️ No se pudo refrescar %s en segundo plano: %s", path, e)
+
+        task = asyncio.create_task(refresh())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def aclose(self) -> None:
+        pending = [*self._background, *(f.task for f in self._inflight.values())]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+# ------------------------------
+# Un cliente por event loop
+# ------------------------------
+
+# Las conexiones de httpx quedan atadas al loop donde se abrieron, así que
+# el loop del bot y el loop de los wrappers sync tienen cada uno su cliente.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, TMDBClient]" = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def get_tmdb_client() -> TMDBClient:
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None:
+            client = _clients[loop] = TMDBClient()
+    return client
+
+
+async def close_tmdb_client() -> None:
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
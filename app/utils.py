@@ -1,94 +1,230 @@
-from typing import Dict, Any, List, Literal, Optional
-from pathlib import Path
+from typing import Awaitable, Callable, Dict, Any, List, Literal, Optional, Tuple, TypeVar, Coroutine
+import asyncio
 import json
 import time
 import logging
 import re 
-
-import requests
-
-from .config import settings, groq_client, TMDB_BASE_URL, TMDB_LANG
+import threading
+
+import httpx
+from groq import APIConnectionError, APIStatusError, BadRequestError
+
+from . import metrics
+from .config import settings, TMDB_LANG
+from .groq_client import get_groq_client, close_groq_client
+from .history import HISTORY_PATH, close_history, save_conversation_history, save_conversation_history_async
+from .tmdb_client import get_tmdb_client, close_tmdb_client, tmdb_disk_cache, cache_key
+from .resilience import CircuitBreaker, CircuitOpenError
+from .slot_cache import get_cached_slots, relevant_slots, slots_cache_key, slots_disk_cache, store_slots
+from .slot_classifier import get_slot_classifier
+from .slot_rules import extract_slots_by_rules
+from .slot_schema import SCHEMA_TEXT, SchemaError, decode_slots_output
 
 logger = logging.getLogger("moodflix")
 
+T = TypeVar("T")
+
 # ------------------------------
-# Historial de conversación
+# Async – helpers
 # ------------------------------
 
-HISTORY_PATH = Path("data/conversation_history.json")
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_loop_lock = threading.Lock()
 
 
-def save_conversation_history(
-    user_id: str,
-    user_text: str,
-    bot_text: str,
-    parsed: Dict[str, Any]
-) -> None:
-    """
-    Guarda en data/conversation_history.json el historial básico de la conversación.
-    Lo dejamos igual que antes para que puedas analizar después.
-    """
-    HISTORY_PATH.parent.mkdir(parents=True, exist_ok=True)
-
-    data: List[Dict[str, Any]] = []
-    if HISTORY_PATH.exists():
-        try:
-            with open(HISTORY_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except Exception as e:
-            logger.warning(f"⚠️ No se pudo leer el historial previo: {e}")
-            data = []
-
-    data.append(
-        {
-            "user_id": user_id,
-            "user_message": user_text,
-            "bot_response": bot_text,
-            "parsed": parsed,
-            "timestamp": time.time(),
-        }
-    )
+def _run_sync_loop(loop: asyncio.AbstractEventLoop) -> None:
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_forever()
+    finally:
+        loop.close()
+
+
+def _get_sync_loop() -> asyncio.AbstractEventLoop:
+    """
+    Event loop en un thread aparte que usan los wrappers sincrónicos.
+    Así la API sync sigue andando sin duplicar la lógica async.
+    """
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None or _sync_loop.is_closed():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=_run_sync_loop,
+                args=(loop,),
+                name="moodflix-sync-loop",
+                daemon=True,
+            )
+            thread.start()
+            _sync_loop = loop
+        return _sync_loop
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    Ejecuta una corrutina desde código sincrónico y espera el resultado.
+    No se puede usar desde adentro de un event loop (lo bloquearía):
+    ahí hay que llamar directamente a la versión *_async.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        coro.close()
+        raise RuntimeError("run_sync() llamado dentro de un event loop; usá la versión async")
+
+    future = asyncio.run_coroutine_threadsafe(coro, _get_sync_loop())
+    return future.result()
+
+
+async def startup_clients() -> None:
+    """
+    Abre el pool HTTP de TMDB del loop actual (hook de arranque del bot).
+    """
+    get_tmdb_client().open()
 
-    # Limitar tamaño del historial
-    if len(data) > 300:
-        data = data[-300:]
 
-    with open(HISTORY_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+async def _close_loop_clients() -> None:
+    await close_tmdb_client()
+    await close_groq_client()
 
 
+async def shutdown_clients() -> None:
+    """
+    Cierra los clientes HTTP del loop actual y frena el loop de los
+    wrappers sync (hook de apagado del bot).
+    """
+    global _sync_loop
+    await _close_loop_clients()
+
+    with _sync_loop_lock:
+        loop, _sync_loop = _sync_loop, None
+    if loop is not None and loop.is_running():
+        future = asyncio.run_coroutine_threadsafe(_close_loop_clients(), loop)
+        await asyncio.wrap_future(future)
+        loop.call_soon_threadsafe(loop.stop)
+
+    for disk_cache in (tmdb_disk_cache, slots_disk_cache):
+        if disk_cache is not None:
+            disk_cache.close()
+    close_history()
+
 # ------------------------------
 # Groq – helpers
 # ------------------------------
 
-def groq_chat(system_prompt: str, user_prompt: str, temperature: float = 0.2) -> str:
+# Si Groq está caído o muy lento, dejamos de esperarlo un rato
+groq_breaker = CircuitBreaker(
+    "groq.breaker",
+    failure_threshold=settings.groq_breaker_failures,
+    reset_timeout=settings.groq_breaker_reset,
+    slow_call_seconds=settings.groq_breaker_slow_call,
+)
+
+
+async def groq_chat_async(
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float = 0.2,
+    max_tokens: int = 512,
+    json_mode: bool = False,
+) -> str:
+    """
+    Llamada a Groq protegida por groq_breaker: con el circuito abierto
+    levanta CircuitOpenError sin esperar el timeout. Si se cancela la
+    tarea, el request se corta y la conexión vuelve al pool.
+    Con json_mode=True Groq solo puede devolver un objeto JSON.
+    """
+    groq_breaker.check()
 
     logger.info("📡 Request a Groq → %s...", user_prompt[:80])
 
-    resp = groq_client.chat.completions.create(
-        model=settings.llm_model,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        temperature=temperature,
-        max_tokens=512,
-    )
+    extra: Dict[str, Any] = {}
+    if json_mode:
+        extra["response_format"] = {"type": "json_object"}
 
-    content = resp.choices[0].message.content
+    start = time.perf_counter()
+    try:
+        resp = await asyncio.wait_for(
+            get_groq_client().chat.completions.create(
+                model=settings.llm_model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt},
+                ],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                **extra,
+            ),
+            timeout=settings.groq_deadline,
+        )
+    except APIStatusError as e:
+        # Los 4xx (salvo 429) son problema del pedido, no de Groq
+        if e.status_code >= 500 or e.status_code == 429:
+            groq_breaker.record_failure()
+        else:
+            groq_breaker.record_success()
+        raise
+    except asyncio.CancelledError:
+        groq_breaker.release()
+        raise
+    except Exception:
+        groq_breaker.record_failure()
+        raise
+    elapsed = time.perf_counter() - start
+    groq_breaker.record_success(elapsed)
+
+    choice = resp.choices[0]
+    content = choice.message.content or ""
+    if choice.finish_reason == "length":
+        metrics.incr("groq.truncated")
 
     logger.info("📡 Respuesta de Groq ← %s...", content[:80])
+    _record_groq_usage(resp, elapsed)
 
     return content
 
-def groq_json(system_prompt: str, user_prompt: str) -> Dict[str, Any]:
+
+def groq_chat(system_prompt: str, user_prompt: str, temperature: float = 0.2) -> str:
     """
-    Igual que groq_chat, pero asumiendo que el modelo responde SOLO JSON.
-    Si falla el parseo, devuelve {}.
-    Además, limpia fences tipo ```json ... ``` que a veces agrega el modelo.
+    Versión sync de groq_chat_async.
     """
-    content = groq_chat(system_prompt, user_prompt, temperature=0.0)
+    return run_sync(groq_chat_async(system_prompt, user_prompt, temperature))
 
+
+def _record_groq_usage(resp: Any, elapsed: float) -> None:
+    """
+    Tokens de entrada/salida (y cacheados, si el proveedor los informa)
+    de cada llamada, para comparar prompts y latencias.
+    """
+    metrics.observe("groq.latency", elapsed)
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return
+
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", 0) or 0
+
+    metrics.incr("groq.calls")
+    metrics.incr("groq.tokens.in", prompt_tokens)
+    metrics.incr("groq.tokens.out", completion_tokens)
+    metrics.incr("groq.tokens.cached", cached_tokens)
+    metrics.observe("groq.tokens.in", prompt_tokens)
+    metrics.observe("groq.tokens.out", completion_tokens)
+
+    logger.info(
+        "🧾 Groq tokens: in=%d (cache=%d) out=%d en %.0f ms",
+        prompt_tokens, cached_tokens, completion_tokens, elapsed * 1000,
+    )
+
+def _parse_groq_json(content: str) -> Dict[str, Any]:
+    """
+    Parsea la respuesta de Groq como JSON. Si falla, devuelve {}.
+    Además, limpia fences tipo ```json ... ``` que a veces agrega el modelo.
+    """
     cleaned = content.strip()
 
     if cleaned.startswith("```"):
@@ -107,124 +243,230 @@ def groq_json(system_prompt: str, user_prompt: str) -> Dict[str, Any]:
         logger.warning("⚠️ No se pudo parsear JSON desde Groq. Respuesta (inicio): %s", preview)
         return {}
 
+
+async def groq_json_async(system_prompt: str, user_prompt: str) -> Dict[str, Any]:
+    """
+    Igual que groq_chat_async, pero asumiendo que el modelo responde SOLO
+    JSON. Si falla el parseo, Groq no contesta a tiempo o el circuito está
+    abierto, devuelve {}.
+    """
+    content = await _groq_or_none(system_prompt, user_prompt)
+    if content is None:
+        return {}
+    return _parse_groq_json(content)
+
+
+async def _groq_or_none(system_prompt: str, user_prompt: str, **kwargs: Any) -> Optional[str]:
+    """
+    groq_chat_async con temperature=0 que devuelve None en vez de fallar si
+    el circuito está abierto, Groq no responde o responde con error (5xx,
+    429 después de los reintentos, credenciales): el bot sigue sin
+    interpretar el mensaje en vez de quedarse sin contestar. En modo JSON,
+    si Groq rechaza su propia salida (json_validate_failed), devuelve esa
+    salida para poder repararla.
+    """
+    try:
+        return await groq_chat_async(system_prompt, user_prompt, temperature=0.0, **kwargs)
+    except CircuitOpenError:
+        logger.warning("⚠️ Circuito de Groq abierto: sigo sin interpretar el mensaje")
+    except (asyncio.TimeoutError, APIConnectionError) as e:
+        logger.warning("⚠️ Groq no respondió (%s): sigo sin interpretar el mensaje", type(e).__name__)
+    except BadRequestError as e:
+        body = e.body if isinstance(e.body, dict) else {}
+        body = body.get("error", body)
+        if body.get("code") == "json_validate_failed":
+            return str(body.get("failed_generation") or "")
+        logger.error("❌ Groq rechazó el pedido (400): %s", e.message)
+    except APIStatusError as e:
+        if e.status_code >= 500 or e.status_code == 429:
+            logger.warning("⚠️ Groq respondió %d: sigo sin interpretar el mensaje", e.status_code)
+        else:
+            # 401/403/404: configuración (API key, modelo), no se arregla sola
+            logger.error("❌ Groq respondió %d: %s", e.status_code, e.message)
+    return None
+
+
+def groq_json(system_prompt: str, user_prompt: str) -> Dict[str, Any]:
+    """
+    Versión sync de groq_json_async.
+    """
+    return run_sync(groq_json_async(system_prompt, user_prompt))
+
+
 def extract_slots_from_text(
     user_text: str,
     last_question: Optional[str] = None,
     prev_slots: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Versión sync de extract_slots_from_text_async.
+    """
+    return run_sync(extract_slots_from_text_async(user_text, last_question, prev_slots))
+
+
+async def extract_slots_from_text_async(
+    user_text: str,
+    last_question: Optional[str] = None,
+    prev_slots: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     """
     Llama a Groq para interpretar la intención y los slots del usuario.
     Usa contexto de la última pregunta para entender respuestas cortas
-    tipo 'pocas', 'largos', 'conocida', etc.
-    """
-    prev_slots = prev_slots or {}
-    last_question = last_question or "ninguna (podés inferir por el mensaje)"
-    prev_slots_json = json.dumps(prev_slots, ensure_ascii=False)
-
-    system_prompt = """Sos un asistente que SOLO devuelve JSON con este formato:
-
-{{
-  "intent": "recommendation" | "answer" | "other",
-  "slots": {{
-    "tipo_contenido": "movie" | "tv" | "indiferente" | null,
-    "generos": ["comedia", "terror", "drama", ...],
-    "tono": "liviano" | "intenso" | "emocional" | "indiferente" | null,
-    "novedad": "nuevo" | "clasico" | "indiferente" | null,
-    "duracion_peli": "corta" | "larga" | "indiferente" | null,
-    "temporadas": "pocas" | "varias" | "indiferente" | null,
-    "episodios_totales": "pocos" | "muchos" | "indiferente" | null,
-    "duracion_capitulo": "cortos" | "largos" | "indiferente" | null,
-    "contexto": "solo" | "pareja" | "amigxs" | "familia" | null,
-    "fama": "conocida" | "joyita" | "indiferente" | null,
-    "restricciones": [],
-    "personas_like": [],
-    "personas_dislike": [],
-    "tematicas": [],
-    "cantidad_recs": 1
-  }}
-}}
-
-Contexto de la conversación:
-- Última pregunta: "{last_question}"
-- Slots actuales: {prev_slots_json}
-
-REGLAS:
-
-1. Respuestas cortas a preguntas:
-   - Pregunta: "¿Pocas temporadas o varias?" → usuario: "pocas" → "temporadas": "pocas"
-   - Pregunta: "¿Pocos capítulos o muchos?" → usuario: "pocos" → "episodios_totales": "pocos"
-   - Pregunta: "¿Capítulos cortos o largos?" → usuario: "largos" → "duracion_capitulo": "largos"
-   - Pregunta: "¿Muy conocido o poco vista?" → usuario: "bastante conocido" → "fama": "conocida"
-   - Pregunta: "¿Solo, pareja, amigos o familia?" → usuario: "amigxs" → "contexto": "amigxs"
-
-2. Sinónimos aceptados:
-   - "pocas", "una temporada", "corta" → "pocas"
-   - "varias", "muchas", "larga" → "varias"
-   - "cortos", "cortitos", "20 minutos" → "cortos"
-   - "largos", "45 minutos", "una hora" → "largos"
-   - "nuevo", "moderno", "reciente" → "nuevo"
-   - "clásico", "viejo", "antiguo" → "clasico"
-   - "conocida", "popular", "famosa" → "conocida"
-   - "joyita", "poco conocida", "joya oculta" → "joyita"
-
-3. Indiferencia:
-   Cuando el usuario diga: "me da igual", "indiferente", "no sé", "cualquiera", "como quieras", 
-   "lo que vos digas", "no tengo preferencia", "sin preferencia", "me es indistinto", etc.
-   → Asigna el slot correspondiente a "indiferente"
-   
-   Ejemplos:
-   - Pregunta: "¿Pocas temporadas o varias?" → usuario: "me da igual" → "temporadas": "indiferente"
-   - Pregunta: "¿Preferís nuevo o clásico?" → usuario: "cualquiera" → "novedad": "indiferente"
-
-4. Intent:
-   - "recommendation": cuando pide que recomiende algo o cambia de tipo (peli/serie)
-   - "answer": cuando responde una de tus preguntas
-   - "other": cuando habla de algo no relacionado
-
-5. IMPORTANTE - SOLO INCLUYE SLOTS QUE EL USUARIO MENCIONÓ:
-   - NO completes automáticamente con "indiferente" los slots que no aparecen en el mensaje.
-   - Si el usuario solo dice "terror", devuelve SOLO:
-     {{
-       "intent": "answer",
-       "slots": {{
-         "generos": ["terror"]
-       }}
-     }}
-   - NO devuelvas "novedad", "duracion_peli", "fama", etc. si el usuario no las mencionó.
-
-6. Restricciones (si el usuario las menciona):
-   - "no animada", "sin animación" → "restricciones": ["no_animacion"]
-   - "no terror", "sin miedo" → "restricciones": ["no_terror"]
-   - "no gore", "no sangre" → "restricciones": ["no_gore"]
-   - "no romance", "sin romance" → "restricciones": ["no_romance"]
-   - "no sci-fi", "sin fantasía" → "restricciones": ["no_scifi"]
-   - "no crimen", "no policiales" → "restricciones": ["no_crimen"]
-   - "no guerra", "no bélicas" → "restricciones": ["no_guerra"]
-
-7. Contexto social (si el usuario lo menciona):
-   - "solo", "sola", "solito" → "contexto": "solo"
-   - "pareja", "novio", "novia" → "contexto": "pareja"
-   - "amigxs", "amigos", "mis amigas" → "contexto": "amigxs"
-   - "familia", "familiar" → "contexto": "familia"
-
-8. Temáticas (si el usuario las menciona):
-   - "sobrenatural" → "tematicas": ["sobrenatural"]
-   - "vampiros" → "tematicas": ["vampiros"]
-   - "hombres lobo" → "tematicas": ["hombres_lobo"]
-   - "doctores", "médicos" → "tematicas": ["doctores"]
-   - "abogados" → "tematicas": ["abogados"]
-   - "guerra", "bélica" → "tematicas": ["guerra"]
-   - "amistad", "amigos" → "tematicas": ["amigos"]
-   - "carreras", "autos" → "tematicas": ["carreras_autos"]
-   - "basada en hechos reales" → "tematicas": ["hechos_reales"]
-
-Devolvé SIEMPRE solo el JSON, sin texto adicional ni ```.
-""".format(last_question=last_question, prev_slots_json=prev_slots_json)
-
-    user_prompt = f"Mensaje del usuario: {user_text}"
-
-    data = groq_json(system_prompt, user_prompt)
+    tipo 'pocas', 'largos', 'conocida', etc. Las respuestas que resuelven
+    las reglas locales (slot_rules) o que ya están en cache (slot_cache)
+    no llaman a Groq.
+    """
+    key = slots_cache_key(user_text, last_question, prev_slots)
+    local = await _extract_slots_without_llm(user_text, last_question, key)
+    if local is not None:
+        return local
+
+    metrics.incr("slots.llm")
+    user_prompt = _build_slots_user_prompt(user_text, last_question, prev_slots)
+    data = await _groq_extract_slots(user_prompt)
+    parsed = _normalize_parsed_slots(data)
+    if data:
+        parsed["source"] = "groq"
+        store_slots(key, parsed)
+    else:
+        # Groq no contestó (timeout, circuito, salida inválida): el "other"
+        # vacío no es una interpretación, no sirve como etiqueta
+        parsed["source"] = "fallback"
+    return parsed
 
+
+async def _groq_extract_slots(user_prompt: str) -> Dict[str, Any]:
+    """
+    Extracción en modo JSON estricto con el esquema compacto (slot_schema).
+    Si la salida no valida, hay un único intento de reparación barato (sin
+    el prompt largo). Devuelve {} si no se consiguió una salida válida.
+    """
+    max_tokens = settings.groq_slots_max_tokens
+    content = await _groq_or_none(SLOTS_SYSTEM_PROMPT, user_prompt, max_tokens=max_tokens, json_mode=True)
+    if content is None:
+        return {}
+
+    try:
+        data = decode_slots_output(content)
+        metrics.incr("slots.decode.ok")
+        return data
+    except SchemaError as e:
+        error = str(e)
+    metrics.incr("slots.decode.error")
+    logger.warning("⚠️ Salida de Groq inválida (%s), intento repararla: %s", error, content[:120])
+
+    repaired = await _groq_or_none(
+        SLOTS_REPAIR_PROMPT,
+        f"Salida: {content[:500]}\nError: {error}",
+        max_tokens=max_tokens,
+        json_mode=True,
+    )
+    try:
+        data = decode_slots_output(repaired or "")
+    except SchemaError:
+        metrics.incr("slots.decode.repair_failed")
+        logger.warning("⚠️ No se pudo reparar la salida de Groq")
+        return {}
+    metrics.incr("slots.decode.repaired")
+    return data
+
+
+async def _extract_slots_without_llm(
+    user_text: str,
+    last_question: Optional[str],
+    key: str,
+) -> Optional[Dict[str, Any]]:
+    """
+    Intenta resolver el mensaje con reglas locales, el cache o el
+    clasificador entrenado (en ese orden). Devuelve None si hace falta
+    preguntarle a Groq. El resultado lleva "source" para no reentrenar
+    el clasificador con sus propias predicciones.
+    """
+    local = extract_slots_by_rules(user_text, last_question)
+    if local is not None and local[1] >= settings.slot_rules_min_confidence:
+        parsed, confidence = local
+        metrics.incr("slots.rules.hit")
+        metrics.incr("slots.llm_skipped")
+        logger.info(
+            "⚡ Slots por reglas (confianza=%.2f, %.0f%% de turnos sin LLM)",
+            confidence,
+            100 * metrics.ratio("slots.llm_skipped", "slots.llm"),
+        )
+        return {**_normalize_parsed_slots(parsed), "source": "rules"}
+    metrics.incr("slots.rules.miss")
+
+    cached = await get_cached_slots(key)
+    if cached is not None:
+        metrics.incr("slots.llm_skipped")
+        return {**cached, "source": "cache"}
+
+    model = get_slot_classifier(settings.slot_classifier_path)
+    if model is not None:
+        parsed, confidence = model.predict(user_text, last_question)
+        if confidence >= settings.slot_classifier_min_confidence:
+            metrics.incr("slots.classifier.hit")
+            metrics.incr("slots.llm_skipped")
+            logger.info("🤖 Slots por clasificador local (confianza=%.2f)", confidence)
+            return {**_normalize_parsed_slots(parsed), "source": "classifier"}
+        metrics.incr("slots.classifier.miss")
+    return None
+
+
+# El system prompt es 100% estático (mismo prefijo en todas las llamadas,
+# así el proveedor lo puede cachear); lo que cambia por turno va al final,
+# en el mensaje del usuario, y solo con los slots que importan.
+SLOTS_SYSTEM_PROMPT = """Sos un extractor de preferencias para un recomendador de pelis y series.
+Respondé SOLO un objeto JSON en una línea, sin espacios extra, con este esquema:
+""" + SCHEMA_TEXT + """
+
+Nunca completes slots que el usuario no mencionó. Géneros en español, ej "g":["comedia","terror"].
+
+Respuestas cortas: se asignan al slot de la última pregunta ("pocas" a temporadas → {"i":"a","s":{"te":"pocas"}}).
+
+Sinónimos:
+pocas: "una temporada", "corta" | varias: "muchas", "larga"
+pocos / muchos capítulos: "menos de 30" / "30 o más"
+cortos: "cortitos", "20 minutos" | largos: "45 minutos", "una hora"
+nuevo: "moderno", "reciente" | clasico: "viejo", "antiguo"
+conocida: "popular", "famosa" | joyita: "poco conocida", "joya oculta"
+cx: "sola/solito" → solo; "novio/novia" → pareja; "amigos/amigas" → amigxs; "familiar" → familia
+
+Indiferencia ("me da igual", "no sé", "cualquiera", "como quieras", "sin preferencia", "me es indistinto"...): el slot de la última pregunta va en "indiferente".
+
+r (restricciones):
+"no animada", "sin animación" → no_animacion | "no terror", "sin miedo" → no_terror
+"no gore", "no sangre" → no_gore | "no romance" → no_romance
+"no sci-fi", "sin fantasía" → no_scifi | "no crimen", "no policiales" → no_crimen
+"no guerra", "no bélicas" → no_guerra
+
+tm (temáticas): sobrenatural, vampiros, hombres_lobo, doctores, abogados, guerra, amigos, carreras_autos, hechos_reales (ej "basada en hechos reales" → hechos_reales)."""
+
+# Reparación: prompt chico, solo el esquema
+SLOTS_REPAIR_PROMPT = """Corregí la salida para que sea un objeto JSON válido con este esquema.
+Respondé SOLO el JSON corregido, en una línea:
+""" + SCHEMA_TEXT
+
+
+def _build_slots_user_prompt(
+    user_text: str,
+    last_question: Optional[str] = None,
+    prev_slots: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Parte dinámica del prompt: última pregunta, slots relevantes y mensaje.
+    """
+    relevant = {k: v for k, v in relevant_slots(last_question, prev_slots).items() if v}
+    return (
+        f"Última pregunta: {last_question or 'ninguna'}\n"
+        f"Slots relevantes: {json.dumps(relevant, ensure_ascii=False, separators=(',', ':'))}\n"
+        f"Mensaje: {user_text}"
+    )
+
+
+def _normalize_parsed_slots(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normaliza la respuesta de Groq a {"intent": ..., "slots": {...}}.
+    """
     # Fallback seguro
     intent = data.get("intent", "other")
     slots = data.get("slots", {}) or {}
@@ -335,29 +577,54 @@ def _resolve_genre_ids(content_type: ContentType, generos: List[str]) -> List[in
             ids.append(gid)
     return ids
 
-def _tmdb_get(path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+async def _tmdb_get_async(path: str, params: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Request genérico a TMDB con logging.
+    Request genérico a TMDB (usa el pool de conexiones compartido).
     """
-    if not settings.tmdb_api_key:
-        raise RuntimeError("TMDB_API_KEY no configurada")
+    return await get_tmdb_client().get(path, params)
 
-    url = f"{TMDB_BASE_URL}{path}"
-    full_params = {"api_key": settings.tmdb_api_key, **params}
 
-    logger.info("🎬 TMDB GET → %s | params=%s", url, full_params)
-
-    resp = requests.get(url, params=full_params, timeout=10)
-    resp.raise_for_status()
+def _tmdb_get(path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Versión sincrónica de _tmdb_get_async.
+    """
+    return run_sync(_tmdb_get_async(path, params))
 
-    data = resp.json()
-    return data
 
 def discover_tmdb(content_type: ContentType, slots: Dict[str, Any], page: int = 1) -> Dict[str, Any]:
     """
     Hace una búsqueda en TMDB usando los slots del usuario.
     No elige aún la mejor recomendación, solo trae resultados crudos.
     """
+    return run_sync(discover_tmdb_async(content_type, slots, page))
+
+
+async def discover_tmdb_async(content_type: ContentType, slots: Dict[str, Any], page: int = 1) -> Dict[str, Any]:
+    """
+    Versión async de discover_tmdb.
+    """
+    path, params = _build_discover_request(content_type, slots, page)
+    return await _tmdb_get_async(path, params)
+
+
+def discover_query_key(content_type: ContentType, slots: Dict[str, Any]) -> str:
+    """
+    Identifica la búsqueda que harían estos slots (sin la página).
+    Dos juegos de slots con la misma clave traen los mismos resultados.
+    """
+    path, params = _build_discover_request(content_type, slots)
+    params.pop("page", None)
+    return cache_key(path, params)
+
+
+def _build_discover_request(
+    content_type: ContentType,
+    slots: Dict[str, Any],
+    page: int = 1,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Traduce los slots del usuario al endpoint y los params de búsqueda en TMDB.
+    """
 
     restricciones = slots.get("restricciones") or []
     tematicas = slots.get("tematicas") or []
@@ -489,28 +756,52 @@ def discover_tmdb(content_type: ContentType, slots: Dict[str, Any], page: int =
     else:
         path = "/discover/movie" if content_type == "movie" else "/discover/tv"
 
-    # -----------------------------
-    # Llamada final a TMDB
-    # -----------------------------
-    data = _tmdb_get(path, params)
-    return data
+    return path, params
 
 # ------------------------------
 # TMDB – plataformas en Argentina
 # ------------------------------
 
+# Sub-recursos que se piden junto con los detalles (un solo request por título)
+DETAILS_APPEND = "watch/providers"
+
 def get_watch_providers(
     content_type: ContentType,
     tmdb_id: int,
     region: str | None = None,
+    details: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     """
     Devuelve info de en qué plataformas se puede ver (flatrate, rent, buy)
     para una película o serie, filtrado por región (default: AR).
+
+    Si se pasan los `details` pedidos con DETAILS_APPEND, usa el bloque
+    "watch/providers" que ya viene embebido y no hace otro request.
+    """
+    return run_sync(get_watch_providers_async(content_type, tmdb_id, region, details))
+
+
+async def get_watch_providers_async(
+    content_type: ContentType,
+    tmdb_id: int,
+    region: str | None = None,
+    details: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Versión async de get_watch_providers.
     """
     region = (region or settings.region or "AR").upper()
 
-    data = _tmdb_get(f"/{content_type}/{tmdb_id}/watch/providers", {})
+    data = (details or {}).get("watch/providers")
+    if data is None:
+        data = await _tmdb_get_async(f"/{content_type}/{tmdb_id}/watch/providers", {})
+    return _parse_watch_providers(data, region)
+
+
+def _parse_watch_providers(data: Dict[str, Any], region: str) -> Dict[str, Any]:
+    """
+    Extrae de la respuesta de /watch/providers las plataformas de una región.
+    """
     results = data.get("results", {})
     region_info = results.get(region)
 
@@ -570,6 +861,133 @@ def format_providers_message(providers: Dict[str, Any], content_type: ContentTyp
     return f"📺 Esta {label} se puede ver en Argentina en:\n- " + "\n- ".join(parts)
 
 
+# ------------------------------
+# Ranking de candidatos (con los datos del listado, sin pedir detalles)
+# ------------------------------
+
+def score_por_contexto(genre_ids: List[int], contexto: Optional[str]) -> int:
+    """
+    Puntúa un candidato según con quién lo va a ver el usuario.
+    """
+    puntuacion = 0
+
+    # SOLO → puede ser más intenso o profundo
+    if contexto == "solo":
+        if 27 in genre_ids:  # terror
+            puntuacion += 20
+        if 53 in genre_ids:  # suspenso
+            puntuacion += 15
+        if 80 in genre_ids:  # crimen
+            puntuacion += 10
+        if 18 in genre_ids:  # drama
+            puntuacion += 8
+
+    # PAREJA → prioriza romance, drama, comedia
+    if contexto == "pareja":
+        if 10749 in genre_ids:  # romance
+            puntuacion += 20
+        if 35 in genre_ids:  # comedia
+            puntuacion += 12
+        if 18 in genre_ids:  # drama
+            puntuacion += 10
+
+    # AMIGXS → prioriza comedia, acción, terror suave, cosas divertidas
+    if contexto == "amigxs":
+        if 35 in genre_ids:  # comedia
+            puntuacion += 20
+        if 28 in genre_ids:  # acción
+            puntuacion += 10
+        if 27 in genre_ids:  # terror
+            puntuacion += 5  # pero no extremo
+        if 10759 in genre_ids:  # sci-fi & fantasy (series)
+            puntuacion += 8
+
+    # FAMILIA → prioriza familiar, animación suave, aventura
+    if contexto == "familia":
+        if 10751 in genre_ids:  # familiar
+            puntuacion += 20
+        if 16 in genre_ids:  # animación
+            puntuacion += 10
+        if 12 in genre_ids:  # aventura
+            puntuacion += 12
+        # penalización para contenido inapropiado
+        if 27 in genre_ids:  # terror
+            puntuacion -= 50
+        if 53 in genre_ids:  # suspenso oscuro
+            puntuacion -= 20
+
+    return puntuacion
+
+
+def penalizar_por_restricciones(genre_ids: List[int], restricciones: List[str]) -> int:
+    """
+    Penaliza un candidato según las restricciones del usuario.
+    """
+    score = 0
+
+    # No gore → fuerte penalización a terror/suspenso/crimen
+    if "no_gore" in restricciones:
+        if 27 in genre_ids: score -= 40   # terror
+        if 53 in genre_ids: score -= 30   # suspenso oscuro
+        if 80 in genre_ids: score -= 20   # crimen
+
+    # No terror
+    if "no_terror" in restricciones:
+        if 27 in genre_ids: score -= 100
+        # suspenso también puede molestar
+        if 53 in genre_ids: score -= 20
+
+    # No romance
+    if "no_romance" in restricciones:
+        if 10749 in genre_ids: score -= 50
+
+    # No sci-fi
+    if "no_scifi" in restricciones:
+        if 878 in genre_ids: score -= 40
+        if 14 in genre_ids: score -= 40
+
+    # No crimen
+    if "no_crimen" in restricciones:
+        if 80 in genre_ids: score -= 60
+
+    # No guerra
+    if "no_guerra" in restricciones:
+        if 10752 in genre_ids: score -= 60
+
+    # No animación → por si TMDB devolvió algo igual
+    if "no_animacion" in restricciones:
+        if 16 in genre_ids: score -= 100
+
+    return score
+
+
+def rank_candidates(results: List[Dict[str, Any]], slots: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Filtra y ordena la página de TMDB usando solo los campos del listado
+    (genre_ids, vote_count, overview), antes de pedir ningún detalle.
+    A igual puntaje se respeta el orden de TMDB (sort_by del discover).
+    """
+    contexto = slots.get("contexto")
+    restricciones = slots.get("restricciones") or []
+
+    candidatos = []
+    for item in results:
+        if not item.get("id"):
+            continue
+        # Mismos filtros de calidad que con los detalles, pero sin pedirlos
+        if int(item.get("vote_count") or 0) < 50:
+            continue
+        if not (item.get("overview") or "").strip():
+            continue
+        candidatos.append(item)
+
+    def puntaje(item: Dict[str, Any]) -> int:
+        genre_ids = item.get("genre_ids") or []
+        return score_por_contexto(genre_ids, contexto) + penalizar_por_restricciones(genre_ids, restricciones)
+
+    return sorted(candidatos, key=puntaje, reverse=True)
+
+
 # ------------------------------
 # Recomendar a partir de resultados TMDB (con filtros de calidad)
 # ------------------------------
@@ -579,7 +997,22 @@ def build_recommendations_from_tmdb(
     tmdb_results: Dict[str, Any],
     slots: Dict[str, Any],
 ) -> List[Dict[str, Any]]:
+    """
+    Versión sincrónica de build_recommendations_from_tmdb_async.
+    """
+    return run_sync(build_recommendations_from_tmdb_async(content_type, tmdb_results, slots))
 
+
+async def build_recommendations_from_tmdb_async(
+    content_type: ContentType,
+    tmdb_results: Dict[str, Any],
+    slots: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    """
+    Dos fases: primero rankea toda la página con los datos del listado
+    (rank_candidates) y después hidrata solo los mejores
+    (hydrate_ranked_async).
+    """
     results = tmdb_results.get("results", []) or []
     if not results:
         return []
@@ -587,92 +1020,182 @@ def build_recommendations_from_tmdb(
     max_recs = int(slots.get("cantidad_recs") or 1)
     max_recs = max(1, min(max_recs, 5))
 
-    recs: List[Dict[str, Any]] = []
+    ranked = rank_candidates(results, slots)
+    recs, _, _ = await hydrate_ranked_async(content_type, ranked, max_recs)
+    return recs
 
-    for item in results:
 
-        tmdb_id = item.get("id")
-        if not tmdb_id:
-            continue
+# Callback para ir entregando recomendaciones a medida que se hidratan
+RecCallback = Callable[[Dict[str, Any]], Awaitable[None]]
 
-        # ---------------------------------------
-        # 1) Obtener detalles completos
-        # ---------------------------------------
-        path = f"/movie/{tmdb_id}" if content_type == "movie" else f"/tv/{tmdb_id}"
-        details = _tmdb_get(path, {"language": TMDB_LANG})
 
-        if not details:
-            continue
+async def hydrate_ranked_async(
+    content_type: ContentType,
+    ranked: List[Dict[str, Any]],
+    max_recs: int,
+    on_rec: Optional[RecCallback] = None,
+) -> Tuple[List[Dict[str, Any]], List[int], List[int]]:
+    """
+    Hidrata candidatos ya rankeados hasta conseguir `max_recs` que pasen
+    los filtros de detalle. Devuelve (recs, usados, fallidos): usados son
+    los ids que se mostraron o que se descartaron (filtros de calidad, 4xx
+    de TMDB); fallidos, los que no se pudieron traer porque TMDB no anda
+    (red, 5xx, circuito abierto), que quien llama puede reintentar más
+    adelante.
+
+    Arranca con `max_recs` requests en vuelo (si todos pasan los filtros
+    se hacen exactamente K) y con cada candidato descartado o fallido
+    suma uno más, hasta TMDB_HYDRATION_CONCURRENCY. Los recs salen en el
+    orden del ranking y, si se pasa `on_rec`, se avisa cada uno apenas
+    está listo.
+
+    Si TMDB falla TMDB_HYDRATION_CONCURRENCY veces sin ninguna respuesta
+    levanta el último error en vez de recorrer toda la lista.
+    """
+    if not ranked or max_recs <= 0:
+        return [], [], []
 
-        # ---------------------------------------
-        # 2) FILTROS DE CALIDAD (los 3 pedidos)
-        # ---------------------------------------
+    concurrency = max(1, settings.tmdb_hydration_concurrency)
+    tasks: List[asyncio.Task] = []
+    recs: List[Dict[str, Any]] = []
+    used: List[int] = []
+    failed: List[int] = []
+    error: Optional[BaseException] = None
+    try:
+        # Esperamos en orden: el resultado respeta el orden del ranking
+        for i, item in enumerate(ranked):
+            # Los que faltan + uno por cada descartado hasta ahora
+            misses = len(used) - len(recs) + len(failed)
+            in_flight = min(concurrency, max_recs - len(recs) + misses)
+            while len(tasks) < len(ranked) and len(tasks) - i < in_flight:
+                tasks.append(asyncio.create_task(_hydrate_candidate(content_type, ranked[len(tasks)])))
+
+            try:
+                rec = await tasks[i]
+            except Exception as e:
+                if not _is_tmdb_outage(e):
+                    # Problema de este candidato (404, datos raros): se descarta
+                    logger.warning("⚠️ Descarto %s/%s: %s", content_type, item["id"], e)
+                    used.append(item["id"])
+                    continue
+                logger.warning("⚠️ No se pudo hidratar %s/%s: %s", content_type, item["id"], e)
+                error = e
+                failed.append(item["id"])
+                if not used and len(failed) >= concurrency:
+                    break
+                continue
 
-        # A) Mínimo de votos (para evitar basuras)
-        vote_count = int(details.get("vote_count") or 0)
-        if vote_count < 50:   # 50 es un buen mínimo global
-            continue
+            used.append(item["id"])
+            if rec is None:
+                continue
+            recs.append(rec)
+            if on_rec is not None:
+                await on_rec(rec)
+            if len(recs) >= max_recs:
+                break
+    finally:
+        # Ya tenemos suficientes (o hubo un error): cancelamos lo pendiente
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    if error is not None and not used:
+        raise error
+    return recs, used, failed
+
+
+def _is_tmdb_outage(error: BaseException) -> bool:
+    """
+    ¿El error es de TMDB caído (y no del candidato puntual)?
+    """
+    if isinstance(error, (httpx.TransportError, CircuitOpenError)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status >= 500 or status == 429
+    return False
 
-        # B) Sinopsis válida
-        overview = (details.get("overview") or "").strip()
-        if not overview or overview in ("", "Sin sinopsis disponible."):
-            continue
 
-        # C) Duración mínima (para evitar cortos, trailers, etc)
-        if content_type == "movie":
-            runtime = details.get("runtime")
-            if runtime is None or runtime < 40:   # menos de 40 min = cortos o trailers
-                continue
-        else:  # tv
-            episodes = details.get("number_of_episodes") or 0
-            if episodes < 2:   # evita "series" de 1 episodio o especiales
-                continue
+async def _hydrate_candidate(content_type: ContentType, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Trae los detalles de un candidato del listado y lo arma como recomendación.
+    Devuelve None si no pasa los filtros de calidad.
+    """
+    tmdb_id = item["id"]
+
+    # ---------------------------------------
+    # 1) Obtener detalles completos (+ plataformas embebidas)
+    # ---------------------------------------
+    path = f"/movie/{tmdb_id}" if content_type == "movie" else f"/tv/{tmdb_id}"
+    details = await _tmdb_get_async(
+        path, {"language": TMDB_LANG, "append_to_response": DETAILS_APPEND}
+    )
 
-        # ---------------------------------------
-        # 3) Formatear datos bonitos
-        # ---------------------------------------
-        if content_type == "movie":
-            title = details.get("title") or details.get("original_title") or "Sin título"
-            year = (details.get("release_date") or "")[:4] or "N/D"
-            runtime = details.get("runtime") or 0
-            duration = f"{runtime} min"
-            seasons = None
-            episodes = None
-        else:
-            title = details.get("name") or details.get("original_name") or "Sin título"
-            year = (details.get("first_air_date") or "")[:4] or "N/D"
-            runtimes = details.get("episode_run_time") or []
-            duration = f"{runtimes[0]} min/episodio" if runtimes else "Duración N/D"
-            seasons = details.get("number_of_seasons")
-            episodes = details.get("number_of_episodes")
-
-        # Géneros
-        genres_detail = details.get("genres") or []
-        genres_text = ", ".join(g.get("name", "") for g in genres_detail[:3]) or "Género N/D"
-
-        # Plataformas en Argentina
-        providers = get_watch_providers(content_type, tmdb_id)
-        providers_text = format_providers_message(providers, content_type)
-
-        # ---------------------------------------
-        # 4) Agregar recomendación final
-        # ---------------------------------------
-        recs.append(
-            {
-                "id": tmdb_id,
-                "title": title,
-                "overview": overview,
-                "genres": genres_text,
-                "year": year,
-                "duration": duration,
-                "seasons": seasons,
-                "episodes": episodes,
-                "providers_text": providers_text,
-            }
-        )
+    if not details:
+        return None
 
-        if len(recs) >= max_recs:
-            break
+    # ---------------------------------------
+    # 2) FILTROS DE CALIDAD (los 3 pedidos)
+    # ---------------------------------------
 
-    return recs
+    # A) Mínimo de votos (para evitar basuras)
+    vote_count = int(details.get("vote_count") or 0)
+    if vote_count < 50:   # 50 es un buen mínimo global
+        return None
 
+    # B) Sinopsis válida
+    overview = (details.get("overview") or "").strip()
+    if not overview or overview in ("", "Sin sinopsis disponible."):
+        return None
+
+    # C) Duración mínima (para evitar cortos, trailers, etc)
+    if content_type == "movie":
+        runtime = details.get("runtime")
+        if runtime is None or runtime < 40:   # menos de 40 min = cortos o trailers
+            return None
+    else:  # tv
+        episodes = details.get("number_of_episodes") or 0
+        if episodes < 2:   # evita "series" de 1 episodio o especiales
+            return None
+
+    # ---------------------------------------
+    # 3) Formatear datos bonitos
+    # ---------------------------------------
+    if content_type == "movie":
+        title = details.get("title") or details.get("original_title") or "Sin título"
+        year = (details.get("release_date") or "")[:4] or "N/D"
+        runtime = details.get("runtime") or 0
+        duration = f"{runtime} min"
+        seasons = None
+        episodes = None
+    else:
+        title = details.get("name") or details.get("original_name") or "Sin título"
+        year = (details.get("first_air_date") or "")[:4] or "N/D"
+        runtimes = details.get("episode_run_time") or []
+        duration = f"{runtimes[0]} min/episodio" if runtimes else "Duración N/D"
+        seasons = details.get("number_of_seasons")
+        episodes = details.get("number_of_episodes")
+
+    # Géneros
+    genres_detail = details.get("genres") or []
+    genres_text = ", ".join(g.get("name", "") for g in genres_detail[:3]) or "Género N/D"
+
+    # Plataformas en Argentina (ya vienen en los detalles)
+    providers = await get_watch_providers_async(content_type, tmdb_id, details=details)
+    providers_text = format_providers_message(providers, content_type)
+
+    # ---------------------------------------
+    # 4) Armar recomendación final
+    # ---------------------------------------
+    return {
+        "id": tmdb_id,
+        "title": title,
+        "overview": overview,
+        "genres": genres_text,
+        "year": year,
+        "duration": duration,
+        "seasons": seasons,
+        "episodes": episodes,
+        "providers_text": providers_text,
+        "genre_ids": item.get("genre_ids") or [g.get("id") for g in genres_detail],
+    }
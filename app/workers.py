@@ -0,0 +1,66 @@
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, Tuple
+import logging
+import threading
+
+logger = logging.getLogger("moodflix")
+
+_Job = Tuple[Future, Callable[..., Any], tuple, dict]
+
+
+class KeyedSerialExecutor:
+    """
+    Pool de threads acotado que respeta el orden por clave.
+
+    Trabajos con claves distintas corren en paralelo (hasta max_workers);
+    trabajos con la misma clave (ej: user_id) corren de a uno y en el
+    orden en que se enviaron.
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = "moodflix-worker") -> None:
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, max_workers),
+            thread_name_prefix=thread_name_prefix,
+        )
+        self._lock = threading.Lock()
+        # Clave -> trabajos pendientes detrás del que está corriendo
+        self._pending: Dict[Hashable, Deque[_Job]] = {}
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        future: Future = Future()
+        job: _Job = (future, fn, args, kwargs)
+
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                # Ya hay un trabajo de esta clave en curso: queda en la fila
+                pending.append(job)
+                return future
+            self._pending[key] = deque()
+
+        self._pool.submit(self._run_key, key, job)
+        return future
+
+    def _run_key(self, key: Hashable, job: _Job) -> None:
+        # El mismo worker encadena los trabajos de la clave hasta vaciar la fila
+        while True:
+            future, fn, args, kwargs = job
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as exc:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(result)
+
+            with self._lock:
+                pending = self._pending[key]
+                if not pending:
+                    del self._pending[key]
+                    return
+                job = pending.popleft()
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
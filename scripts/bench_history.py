@@ -0,0 +1,138 @@
+"""
+Benchmark de los backends del historial: JSONL vs SQLite.
+
+Escribe --rows turnos sintéticos en lotes (como el writer en segundo plano)
+y mide turnos por segundo; después mide cuánto tarda traer los últimos
+turnos de un usuario. El JSONL no tiene índice, así que cada consulta es
+recorrer el archivo entero (se hacen pocas). Todo va a un directorio
+temporal. Correr desde la raíz del repo:
+
+    python -m scripts.bench_history
+    python -m scripts.bench_history --rows 200000 --users 2000 --batch 500
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+# app.config exige estas variables aunque acá no se usen de verdad
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "bench")
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("TMDB_API_KEY", "bench")
+
+from app.config import settings
+from app.history import JsonlHistoryStore, SQLiteHistoryStore
+
+logging.getLogger("moodflix").setLevel(logging.WARNING)
+
+QUESTIONS = ["tipo_contenido", "generos", "tono", "temporadas", "duracion_peli", "contexto", None]
+SLOT_VALUES = {
+    "tipo_contenido": ["movie", "tv"],
+    "generos": [["comedia"], ["terror"], ["drama", "romance"], ["acción"]],
+    "tono": ["liviano", "intenso", "emocional"],
+    "temporadas": ["pocas", "varias"],
+    "duracion_peli": ["corta", "larga"],
+    "contexto": ["solo", "pareja", "amigxs", "familia"],
+}
+
+
+def synthetic_entries(rows: int, users: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    rng = random.Random(seed)
+    start = time.time() - rows
+    for i in range(rows):
+        question = rng.choice(QUESTIONS)
+        slots = {slot: rng.choice(values) for slot, values in SLOT_VALUES.items() if rng.random() < 0.3}
+        yield {
+            "user_id": str(rng.randrange(users)),
+            "user_message": "quiero algo liviano para ver con mi pareja",
+            "bot_response": "¿Preferís peli o serie?",
+            "parsed": {"intent": "answer", "slots": slots, "source": "groq"},
+            "last_question": question,
+            "timestamp": start + i,
+        }
+
+
+def bench_inserts(store: Any, rows: int, users: int, batch: int) -> float:
+    """
+    Turnos por segundo, contando la codificación (que hace quien guarda).
+    """
+    pending: List[Any] = []
+    start = time.perf_counter()
+    for entry in synthetic_entries(rows, users):
+        pending.append(store.encode(entry))
+        if len(pending) >= batch:
+            store.write(pending)
+            pending = []
+    if pending:
+        store.write(pending)
+    return rows / (time.perf_counter() - start)
+
+
+def bench_sqlite_lookups(store: SQLiteHistoryStore, users: int, lookups: int, limit: int) -> List[float]:
+    rng = random.Random(1)
+    latencies = []
+    for _ in range(lookups):
+        user_id = str(rng.randrange(users))
+        start = time.perf_counter()
+        store.for_user(user_id, limit=limit)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_jsonl_lookups(store: JsonlHistoryStore, users: int, lookups: int, limit: int) -> List[float]:
+    rng = random.Random(1)
+    latencies = []
+    for _ in range(lookups):
+        user_id = str(rng.randrange(users))
+        start = time.perf_counter()
+        [entry for entry in store.read() if entry.get("user_id") == user_id][-limit:]
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(label: str, latencies: List[float]) -> None:
+    ms = sorted(x * 1000 for x in latencies)
+    p95 = ms[max(0, int(len(ms) * 0.95) - 1)]
+    print(
+        f"{label:<22} n={len(ms):<5} media={statistics.mean(ms):8.2f} ms  "
+        f"p50={statistics.median(ms):8.2f} ms  p95={p95:8.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--batch", type=int, default=settings.history_batch_size)
+    parser.add_argument("--lookups", type=int, default=1000, help="Consultas por usuario en SQLite")
+    parser.add_argument("--jsonl-lookups", type=int, default=5, help="Consultas en JSONL (cada una recorre todo)")
+    parser.add_argument("--limit", type=int, default=50, help="Turnos por consulta")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jsonl = JsonlHistoryStore(Path(tmp) / "history.jsonl")
+        sqlite = SQLiteHistoryStore(Path(tmp) / "history.sqlite3")
+        try:
+            print(f"{args.rows} turnos, {args.users} usuarios, lotes de {args.batch}")
+            rate = bench_inserts(jsonl, args.rows, args.users, args.batch)
+            # Incluye rotar y comprimir los segmentos que se cierran en el camino
+            size = sum(p.stat().st_size for p in Path(tmp).glob("history*.jsonl*"))
+            print(f"{'jsonl inserts':<22} {rate:,.0f} turnos/s  ({size / 1e6:.0f} MB)")
+            rate = bench_inserts(sqlite, args.rows, args.users, args.batch)
+            print(f"{'sqlite inserts':<22} {rate:,.0f} turnos/s  ({sqlite.path.stat().st_size / 1e6:.0f} MB)")
+
+            jsonl.close()
+            report("jsonl por usuario", bench_jsonl_lookups(jsonl, args.users, args.jsonl_lookups, args.limit))
+            report("sqlite por usuario", bench_sqlite_lookups(sqlite, args.users, args.lookups, args.limit))
+        finally:
+            jsonl.close()
+            sqlite.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark del cliente TMDB: conexión nueva por request vs pool compartido.
+
+Levanta un servidor local que imita a TMDB (HTTP/1.1 con keep-alive) y mide
+la latencia por request de los dos enfoques. Correr desde la raíz del repo:
+
+    python -m scripts.bench_tmdb_client --requests 500
+
+Ojo: el servidor local no usa TLS, así que contra api.themoviedb.org la
+diferencia real es bastante mayor (cada conexión nueva paga el handshake).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+# app.config exige estas variables aunque acá no se usen de verdad
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "bench")
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("TMDB_API_KEY", "bench")
+
+import httpx
+
+from app.tmdb_client import TMDBClient
+
+logging.getLogger("moodflix").setLevel(logging.WARNING)
+
+PAYLOAD = json.dumps(
+    {"id": 550, "title": "Peli de prueba", "overview": "x" * 400, "vote_count": 1000, "runtime": 120}
+).encode("utf-8")
+
+
+class FakeTMDBHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Sin esto, Nagle + delayed ACK meten ~40 ms por respuesta en localhost
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def start_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTMDBHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def bench_fresh_connection(base_url: str, n: int) -> List[float]:
+    """
+    Como antes: una conexión nueva por request.
+    """
+    latencies = []
+    for i in range(n):
+        start = time.perf_counter()
+        async with httpx.AsyncClient(timeout=10) as client:
+            resp = await client.get(f"{base_url}/movie/{i}", params={"api_key": "bench"})
+            resp.raise_for_status()
+            resp.json()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def bench_pooled_client(base_url: str, n: int) -> List[float]:
+    """
+    Ahora: TMDBClient compartido con keep-alive.
+    """
+    client = TMDBClient(
+        base_url=base_url,
+        api_key="bench",
+        cache=None,
+        disk_cache=None,
+        rate_limiter=None,
+        breaker=None,
+    )
+    latencies = []
+    try:
+        for i in range(n):
+            start = time.perf_counter()
+            await client.get(f"/movie/{i}", {})
+            latencies.append(time.perf_counter() - start)
+    finally:
+        await client.aclose()
+    return latencies
+
+
+def report(label: str, latencies: List[float]) -> None:
+    ms = sorted(x * 1000 for x in latencies)
+    p95 = ms[int(len(ms) * 0.95) - 1]
+    print(
+        f"{label:<22} n={len(ms):<5} media={statistics.mean(ms):6.2f} ms  "
+        f"p50={statistics.median(ms):6.2f} ms  p95={p95:6.2f} ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    server = start_server()
+    base_url = f"http://127.0.0.1:{server.server_port}/3"
+
+    try:
+        report("conexión por request", await bench_fresh_connection(base_url, args.requests))
+        report("pool compartido", await bench_pooled_client(base_url, args.requests))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
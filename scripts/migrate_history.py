@@ -0,0 +1,52 @@
+"""
+Migra historial al backend configurado (HISTORY_BACKEND: jsonl o sqlite).
+
+Por defecto toma el historial viejo (data/conversation_history.json, una lista
+JSON que se reescribía entera en cada mensaje); con --source también acepta un
+JSONL, por ejemplo para pasar el historial existente a SQLite:
+
+    python -m scripts.migrate_history
+    python -m scripts.migrate_history --legacy otro_historial.json
+    HISTORY_BACKEND=sqlite python -m scripts.migrate_history --source data/conversation_history.jsonl
+
+Lo que ya tenga el backend se conserva. El JSON viejo se renombra a
+*.migrated; un JSONL de origen queda como estaba.
+"""
+import argparse
+import os
+from pathlib import Path
+
+# app.config exige estas variables aunque acá no se usen de verdad
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "migrate")
+os.environ.setdefault("GROQ_API_KEY", "migrate")
+os.environ.setdefault("TMDB_API_KEY", "migrate")
+
+from app.config import settings
+from app.history import LEGACY_HISTORY_PATH, import_history, migrate_legacy_history, read_history
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--legacy", type=Path, default=LEGACY_HISTORY_PATH)
+    parser.add_argument("--source", type=Path, default=None, help="JSONL a importar (en vez del JSON viejo)")
+    args = parser.parse_args()
+
+    if args.source is not None:
+        if not args.source.exists():
+            print(f"No existe {args.source}")
+            return
+        entries = list(read_history(args.source))
+        import_history(entries)
+        print(f"Importados {len(entries)} turnos de {args.source} al backend {settings.history_backend}")
+        return
+
+    if not args.legacy.exists():
+        print(f"No hay historial viejo en {args.legacy}")
+        return
+
+    count = migrate_legacy_history(args.legacy)
+    print(f"Migrados {count} turnos al backend {settings.history_backend}")
+
+
+if __name__ == "__main__":
+    main()
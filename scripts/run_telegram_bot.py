@@ -1,6 +1,10 @@
+import asyncio
 import logging
+import time
+from typing import Awaitable, Callable, Optional
 
-from telegram import Update
+from telegram import Message, Update
+from telegram.error import TelegramError
 from telegram.ext import (
     ApplicationBuilder,
     MessageHandler,
@@ -9,8 +13,11 @@ from telegram.ext import (
     filters,
 )
 
+from app import metrics
 from app.config import settings
 from app.chat import ChatManager
+from app.utils import startup_clients, shutdown_clients
+from app.workers import KeyedSerialExecutor
 
 # --------------------------------
 # Logging básico
@@ -29,6 +36,137 @@ logger = logging.getLogger("moodflix")
 # --------------------------------
 chat = ChatManager()
 
+# En modo "threads" cada mensaje pasa por un pool de workers acotado que
+# respeta el orden de los mensajes de un mismo usuario. Es un limitador de
+# mensajes en vuelo, no paralelismo: los workers solo esperan a
+# chat.handle_message, que corre todo en el loop único de la API sync
+worker_pool: KeyedSerialExecutor | None = None
+if settings.chat_execution_mode == "threads":
+    worker_pool = KeyedSerialExecutor(settings.chat_workers)
+
+
+Progress = Callable[[str], Awaitable[None]]
+
+
+async def process_message(user_id: str, text: str, progress: Optional[Progress] = None) -> str:
+    """
+    Pasa el mensaje al ChatManager según el modo de ejecución configurado.
+    """
+    if worker_pool is None:
+        return await chat.handle_message_async(user_id, text, progress)
+
+    if progress is not None:
+        progress = _on_loop(progress, asyncio.get_running_loop())
+    future = worker_pool.submit(user_id, chat.handle_message, user_id, text, progress)
+    return await asyncio.wrap_future(future)
+
+
+def _on_loop(progress: Progress, loop: asyncio.AbstractEventLoop) -> Progress:
+    """
+    En modo "threads" el ChatManager corre en otro loop: las llamadas a
+    Telegram tienen que volver al loop del bot.
+    """
+    async def run(text: str) -> None:
+        future = asyncio.run_coroutine_threadsafe(progress(text), loop)
+        await asyncio.wrap_future(future)
+
+    return run
+
+
+# --------------------------------
+# Entrega progresiva
+# --------------------------------
+
+class ProgressMessage:
+    """
+    Respuesta que se manda apenas llega el mensaje (un placeholder, así
+    hay feedback mientras Groq interpreta) y se va editando a medida que
+    llegan el "buscando…" y las recomendaciones.
+
+    Las ediciones que llegan antes de `min_interval` no se pierden: queda
+    la última pendiente y se manda apenas se cumple el intervalo (así la
+    primera tarjeta aparece aunque llegue justo después del "buscando…").
+    """
+
+    def __init__(self, incoming: Message, min_interval: float) -> None:
+        self.incoming = incoming
+        self.min_interval = min_interval
+        self.sent: Optional[Message] = None
+        self.last_text: Optional[str] = None
+        self.last_edit = 0.0
+        self.pending: Optional[str] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._placeholder_task: Optional[asyncio.Task] = None
+        # Un envío/edición a la vez
+        self._lock = asyncio.Lock()
+
+    def start(self, text: str) -> None:
+        """
+        Manda el placeholder sin esperarlo: el mensaje se procesa en paralelo.
+        """
+        self._placeholder_task = asyncio.create_task(self._show_placeholder(text))
+
+    async def _show_placeholder(self, text: str) -> None:
+        try:
+            async with self._lock:
+                # Si ya se mostró algo más nuevo, el placeholder sobra
+                if self.sent is None:
+                    await self._show(text)
+        except TelegramError as e:
+            logger.warning("⚠️ No se pudo mandar el placeholder: %s", e)
+
+    async def update(self, text: str) -> None:
+        wait = self.min_interval - (time.monotonic() - self.last_edit)
+        if self.sent is None or wait <= 0:
+            self.pending = None
+            await self._show_partial(text)
+            return
+
+        self.pending = text
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later(wait))
+
+    async def _flush_later(self, wait: float) -> None:
+        await asyncio.sleep(wait)
+        self._flush_task = None
+        text, self.pending = self.pending, None
+        if text is not None:
+            await self._show_partial(text)
+
+    async def _show_partial(self, text: str) -> None:
+        try:
+            async with self._lock:
+                await self._show(text)
+        except TelegramError as e:
+            logger.warning("⚠️ No se pudo actualizar el mensaje parcial: %s", e)
+
+    def cancel(self) -> None:
+        if self._placeholder_task is not None:
+            self._placeholder_task.cancel()
+        self._drop_pending()
+
+    def _drop_pending(self) -> None:
+        self.pending = None
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+    async def finish(self, text: str) -> None:
+        # El placeholder no se cancela: si está en vuelo, el lock lo espera
+        # y el texto final lo edita (en vez de mandar un segundo mensaje)
+        self._drop_pending()
+        async with self._lock:
+            if text != self.last_text:
+                await self._show(text)
+
+    async def _show(self, text: str) -> None:
+        if self.sent is None:
+            self.sent = await self.incoming.reply_text(text, parse_mode="Markdown")
+        else:
+            await self.sent.edit_text(text, parse_mode="Markdown")
+        self.last_text = text
+        self.last_edit = time.monotonic()
+
 
 # --------------------------------
 # Handlers
@@ -43,7 +181,7 @@ async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     user_id = str(update.effective_user.id)
     logger.info("📲 /start de user_id=%s", user_id)
 
-    response = chat.handle_message(user_id, "/start")
+    response = await process_message(user_id, "/start")
     await update.message.reply_text(response, parse_mode="Markdown")
 
 
@@ -55,8 +193,39 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     text = update.message.text or ""
     logger.info("📩 Mensaje de %s: %s", user_id, text)
 
-    response = chat.handle_message(user_id, text)
-    await update.message.reply_text(response, parse_mode="Markdown")
+    if not settings.telegram_progressive:
+        response = await process_message(user_id, text)
+        await update.message.reply_text(response, parse_mode="Markdown")
+        return
+
+    reply = ProgressMessage(update.message, settings.telegram_edit_interval)
+    reply.start("💭 …")
+    try:
+        response = await process_message(user_id, text, reply.update)
+    except BaseException:
+        reply.cancel()
+        raise
+    await reply.finish(response)
+
+
+# --------------------------------
+# Ciclo de vida
+# --------------------------------
+
+async def on_startup(application) -> None:
+    await startup_clients()
+
+
+async def on_shutdown(application) -> None:
+    # Primero el pool de workers: sus mensajes en curso todavía usan los clientes
+    if worker_pool is not None:
+        await asyncio.to_thread(worker_pool.shutdown)
+    await shutdown_clients()
+    metrics.log_snapshot()
+    logger.info(
+        "⚡ Turnos resueltos sin LLM: %.0f%%",
+        100 * metrics.ratio("slots.llm_skipped", "slots.llm"),
+    )
 
 
 # --------------------------------
@@ -64,9 +233,23 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
 # --------------------------------
 
 def main() -> None:
-    logger.info("🚀 Iniciando bot MoodFlix...")
+    logger.info(
+        "🚀 Iniciando bot MoodFlix (modo=%s, workers=%s)...",
+        settings.chat_execution_mode,
+        settings.chat_workers if worker_pool else "-",
+    )
 
-    application = ApplicationBuilder().token(settings.telegram_bot_token).build()
+    # Updates concurrentes: mientras un usuario espera a Groq/TMDB,
+    # el resto sigue siendo atendido (el orden por usuario lo cuida
+    # ChatManager o, en modo "threads", el pool de workers)
+    application = (
+        ApplicationBuilder()
+        .token(settings.telegram_bot_token)
+        .concurrent_updates(True)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
 
     # Comandos
     application.add_handler(CommandHandler("start", handle_start))
@@ -0,0 +1,142 @@
+"""
+Entrena el clasificador local de intent/slots con el historial de conversaciones.
+
+Cada turno guardado tiene el mensaje del usuario, la última pregunta y lo que
+devolvió Groq: eso son las etiquetas. Separa usuarios de evaluación, mide
+exactitud y latencia contra Groq y después entrena con todo y guarda el modelo.
+Correr desde la raíz del repo:
+
+    python -m scripts.train_slot_classifier
+    python -m scripts.train_slot_classifier --eval-only --threshold 0.85
+"""
+import argparse
+import logging
+import os
+import statistics
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+# app.config exige estas variables aunque acá no se usen de verdad
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "train")
+os.environ.setdefault("GROQ_API_KEY", "train")
+os.environ.setdefault("TMDB_API_KEY", "train")
+
+from app.config import settings
+from app.slot_classifier import (
+    EXTRAS_HEAD,
+    NONE,
+    SLOT_HEADS,
+    SlotClassifier,
+    examples_from_history,
+    is_labelled,
+    labels_from_parsed,
+)
+from app.history import read_history
+
+logging.getLogger("moodflix").setLevel(logging.WARNING)
+
+
+def split_by_user(entries: List[Dict[str, Any]], test_ratio: float) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Separa por usuario (una conversación no queda repartida entre train y test).
+    Con un solo usuario separa por posición.
+    """
+    users = {e.get("user_id") for e in entries}
+    buckets = max(2, round(1 / test_ratio))
+    if len(users) > 1:
+        is_test = [zlib.crc32(str(e.get("user_id")).encode()) % buckets == 0 for e in entries]
+    else:
+        is_test = [i % buckets == 0 for i in range(len(entries))]
+    train = [e for e, t in zip(entries, is_test) if not t]
+    test = [e for e, t in zip(entries, is_test) if t]
+    return train, test
+
+
+def predict_labels(model: SlotClassifier, entry: Dict[str, Any]) -> Tuple[Dict[str, str], float, float]:
+    start = time.perf_counter()
+    parsed, confidence = model.predict(entry.get("user_message") or "", entry.get("last_question"))
+    elapsed = time.perf_counter() - start
+
+    slots = parsed["slots"]
+    labels = {"intent": parsed["intent"], EXTRAS_HEAD: "si" if confidence == 0.0 else "no"}
+    for name in SLOT_HEADS:
+        labels[name] = slots.get(name, NONE)
+    return labels, confidence, elapsed
+
+
+def evaluate(model: SlotClassifier, entries: List[Dict[str, Any]], threshold: float) -> None:
+    labelled = [e for e in entries if is_labelled(e)]
+    if not labelled:
+        print("Sin ejemplos de evaluación.")
+        return
+
+    heads = ["intent", *SLOT_HEADS, EXTRAS_HEAD]
+    correct = {name: 0 for name in heads}
+    exact = 0
+    covered = 0
+    covered_exact = 0
+    latencies: List[float] = []
+
+    for entry in labelled:
+        gold = labels_from_parsed(entry["parsed"])
+        predicted, confidence, elapsed = predict_labels(model, entry)
+        latencies.append(elapsed)
+        hits = [predicted[name] == gold[name] for name in heads]
+        for name, hit in zip(heads, hits):
+            correct[name] += hit
+        exact += all(hits)
+        if confidence >= threshold:
+            covered += 1
+            covered_exact += all(hits)
+
+    n = len(labelled)
+    print(f"Evaluación sobre {n} turnos:")
+    for name in heads:
+        print(f"  {name:<18} {100 * correct[name] / n:5.1f}%")
+    print(f"  {'exacto (todo)':<18} {100 * exact / n:5.1f}%")
+    print(
+        f"Con confianza >= {threshold}: cubre {100 * covered / n:.1f}% de los turnos, "
+        f"exactitud {100 * covered_exact / covered if covered else 0.0:.1f}%"
+    )
+    latencies.sort()
+    print(
+        f"Latencia por predicción: media {1e6 * statistics.mean(latencies):.0f} µs, "
+        f"p95 {1e6 * latencies[int(0.95 * (len(latencies) - 1))]:.0f} µs"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=Path, default=None, help="Por defecto, el backend configurado")
+    parser.add_argument("--output", type=Path, default=Path(settings.slot_classifier_path))
+    parser.add_argument("--threshold", type=float, default=settings.slot_classifier_min_confidence)
+    parser.add_argument("--test-ratio", type=float, default=0.2)
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--eval-only", action="store_true", help="No guarda el modelo")
+    args = parser.parse_args()
+
+    entries = list(read_history(args.history))
+    train, test = split_by_user(entries, args.test_ratio)
+    train_examples = examples_from_history(train)
+    print(f"Historial: {len(entries)} turnos ({len(train_examples)} de entrenamiento etiquetados por Groq)")
+    if not train_examples:
+        print("No hay turnos etiquetados para entrenar.")
+        return
+
+    start = time.perf_counter()
+    model = SlotClassifier.train(train_examples, epochs=args.epochs)
+    print(f"Entrenado en {time.perf_counter() - start:.2f} s")
+    evaluate(model, test, args.threshold)
+
+    if args.eval_only:
+        return
+
+    final = SlotClassifier.train(examples_from_history(entries), epochs=args.epochs)
+    final.save(args.output)
+    print(f"Modelo guardado en {args.output}")
+
+
+if __name__ == "__main__":
+    main()